@@ -1,5 +1,14 @@
 import asyncio
-from bot.telegram_bot import run_bot
+import logging
+
+from config import CFG
 
 if __name__ == "__main__":
-    asyncio.run(run_bot())
+    logging.basicConfig(level=logging.INFO)
+
+    if CFG.get("run_mode", "polling") == "webhook":
+        from bot.webhook import run_webhook
+        asyncio.run(run_webhook())
+    else:
+        from bot.telegram_bot import run_bot
+        asyncio.run(run_bot())
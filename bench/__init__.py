@@ -0,0 +1,20 @@
+"""
+Offline evaluation and throughput benchmark for the disease predictor.
+
+    python -m bench DATA/val                          # pipeline + eager backend
+    python -m bench DATA/val --backends eager,onnx --out bench.json
+    python -m bench DATA/val --baseline old.json      # print changes vs a previous run
+    python -m bench DATA/val --declared-crop          # accuracy with the per-crop logit mask
+
+DATA/val holds one folder per class, named like the keys of
+disease_model/labels.json (PlantVillage layout):
+
+    DATA/val/Tomato___Late_blight/0001.jpg
+
+The report (JSON) has:
+    pipeline   predict_disease() end to end: top-1 accuracy, per-class
+               confusion, p50/p95/p99 latency per photo
+    backends   per inference backend: top-1 accuracy, and for batch sizes
+               1/8/32 images/sec and p50/p95/p99 latency per batch
+    rss        peak resident memory (this process and inference workers)
+"""
@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bench.metrics import accuracy_report, latency_summary, peak_rss_mb
+
+EXTS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def log(*args):
+    # The JSON report may go to stdout; progress goes to stderr
+    print(*args, file=sys.stderr, flush=True)
+
+
+# ============================================================
+# DATASET
+# ============================================================
+def load_dataset(folder: str, per_class: int = 0) -> list:
+    """[(label, image bytes)] for class folders named like labels.json keys."""
+    from core.predictor import CLASSES, LABELS_PATH
+
+    labels = set(CLASSES)
+    samples = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if not os.path.isdir(path):
+            continue
+        if name not in labels:
+            log(f"Skipping {name}: not a label in {LABELS_PATH}")
+            continue
+
+        files = sorted(f for f in os.listdir(path) if f.lower().endswith(EXTS))
+        if per_class:
+            files = files[:per_class]
+        for f in files:
+            with open(os.path.join(path, f), "rb") as fh:
+                samples.append((name, fh.read()))
+    return samples
+
+
+# ============================================================
+# PIPELINE: predict_disease() end to end
+# (decode + preprocess + pool IPC + micro-batcher + model)
+# ============================================================
+async def bench_pipeline(samples: list, declared_crop: bool = False) -> dict:
+    from core.predictor import POOL, crop_key, predict_disease
+
+    def crop_of(label):
+        # As if the user had named the right crop before sending the photo
+        return crop_key(label.split("___")[0]) if declared_crop else None
+
+    # First call starts the workers and loads the model; not timed
+    await predict_disease(samples[0][1])
+
+    truth, predicted, latencies = [], [], []
+    for label, data in samples:
+        start = time.perf_counter()
+        res = await predict_disease(data, crop_of(label))
+        latencies.append(time.perf_counter() - start)
+        truth.append(label)
+        predicted.append(res["raw"])
+
+    # All photos at once: what the micro-batcher makes of a burst
+    start = time.perf_counter()
+    await asyncio.gather(*(predict_disease(data, crop_of(label)) for label, data in samples))
+    burst = len(samples) / (time.perf_counter() - start)
+
+    # Workers must exit for their peak RSS to be counted
+    POOL.shutdown(wait=True)
+
+    return {
+        **accuracy_report(truth, predicted),
+        "latency": latency_summary(latencies),
+        "burst_images_per_sec": round(burst, 2),
+    }
+
+
+# ============================================================
+# BACKENDS: model only, on preprocessed tensors
+# Each backend runs in its own spawned process, so its peak RSS is
+# its own and not the high-water mark of the backends before it.
+# ============================================================
+def bench_backend(samples: list, kind: str, batch_sizes: list, threads: int) -> dict:
+    import torch
+
+    from core.backends import create_backend
+    from core.predictor import CFG, CLASSES, load_model, _load_tensor
+
+    torch.set_num_threads(threads)
+    tensors, truth = [], []
+    for label, data in samples:
+        x = _load_tensor(data)
+        if x is not None:
+            tensors.append(x)
+            truth.append(label)
+    x = torch.stack(tensors)
+
+    backend = create_backend(kind, load_model, CFG, threads)
+
+    logits = torch.cat([backend(x[i:i + 32])[1] for i in range(0, len(x), 32)])
+    predicted = [CLASSES[i] for i in logits.argmax(dim=1).tolist()]
+
+    batches = {}
+    for bs in batch_sizes:
+        backend(x[:bs])   # warm-up (allocator, lazy init)
+        latencies = []
+        for i in range(0, len(x), bs):
+            start = time.perf_counter()
+            backend(x[i:i + bs])
+            latencies.append(time.perf_counter() - start)
+        batches[str(bs)] = {
+            "images_per_sec": round(len(x) / sum(latencies), 2),
+            "batch_latency": latency_summary(latencies),
+        }
+
+    return {
+        **accuracy_report(truth, predicted),
+        "batch": batches,
+        "peak_rss_mb": peak_rss_mb()["self_mb"],
+    }
+
+
+def bench_backends(samples: list, kinds: list, batch_sizes: list, threads: int) -> dict:
+    report = {}
+    for kind in kinds:
+        log(f"Backend {kind}")
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as ex:
+            report[kind] = ex.submit(bench_backend, samples, kind, batch_sizes, threads).result()
+    return report
+
+
+# ============================================================
+# REPORT
+# ============================================================
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return ""
+
+
+def compare(old: dict, new: dict):
+    """Print the headline numbers of two reports side by side."""
+    rows = []
+    if "pipeline" in old and "pipeline" in new:
+        o, n = old["pipeline"], new["pipeline"]
+        rows.append(("pipeline top1", o["top1"], n["top1"]))
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            rows.append((f"pipeline {key}", o["latency"][key], n["latency"][key]))
+
+    for kind, n in new.get("backends", {}).items():
+        o = old.get("backends", {}).get(kind)
+        if not o:
+            continue
+        rows.append((f"{kind} top1", o["top1"], n["top1"]))
+        for bs, nb in n["batch"].items():
+            ob = o["batch"].get(bs)
+            if ob:
+                rows.append((f"{kind} bs={bs} img/s", ob["images_per_sec"], nb["images_per_sec"]))
+        rows.append((f"{kind} peak rss MB", o["peak_rss_mb"], n["peak_rss_mb"]))
+
+    rows.append(("peak rss MB", old["rss"]["self_mb"], new["rss"]["self_mb"]))
+    for name, o, n in rows:
+        change = f"{(n - o) / o * 100:+.1f}%" if o else ""
+        log(f"  {name:28} {o:>10} -> {n:<10} {change}")
+
+
+def main():
+    ap = argparse.ArgumentParser(prog="python -m bench")
+    ap.add_argument("folder", help="one sub-folder per class, named like labels.json keys")
+    ap.add_argument("--backends", default="eager", help="comma-separated: eager,torchscript,int8_linear,onnx")
+    ap.add_argument("--batch-sizes", default="1,8,32")
+    ap.add_argument("--per-class", type=int, default=0, help="at most N images per class (0 = all)")
+    ap.add_argument("--threads", type=int, default=None, help="torch threads for backend runs")
+    ap.add_argument("--no-pipeline", action="store_true", help="skip predict_disease() end to end")
+    ap.add_argument("--declared-crop", action="store_true",
+                    help="pipeline: pass each image's true crop (per-crop logit mask)")
+    ap.add_argument("--out", help="write the JSON report here (default: stdout)")
+    ap.add_argument("--baseline", help="previous report to compare against")
+    args = ap.parse_args()
+
+    samples = load_dataset(args.folder, args.per_class)
+    if not samples:
+        sys.exit(f"No labelled images under {args.folder}")
+    log(f"{len(samples)} images, {len({l for l, _ in samples})} classes")
+
+    from core.predictor import BACKEND, CFG
+
+    threads = args.threads or CFG.get("inference_threads_per_worker", 2)
+    report = {
+        "meta": {
+            "commit": _commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "dataset": os.path.abspath(args.folder),
+            "images": len(samples),
+            "pipeline_backend": BACKEND,
+            "declared_crop": args.declared_crop,
+            "threads": threads,
+        },
+    }
+
+    if not args.no_pipeline:
+        log("Pipeline (predict_disease)")
+        report["pipeline"] = asyncio.run(bench_pipeline(samples, args.declared_crop))
+
+    kinds = [k for k in args.backends.split(",") if k]
+    if kinds:
+        sizes = [int(s) for s in args.batch_sizes.split(",")]
+        report["backends"] = bench_backends(samples, kinds, sizes, threads)
+
+    report["rss"] = peak_rss_mb()
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+        log("Saved:", args.out)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        log(f"Compared with {args.baseline} ({old['meta'].get('commit') or '?'}):")
+        compare(old, report)
+
+
+if __name__ == "__main__":
+    main()
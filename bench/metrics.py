@@ -0,0 +1,70 @@
+import resource
+import sys
+
+
+# ============================================================
+# LATENCY
+# ============================================================
+def percentile(values: list, q: float) -> float:
+    """q-th percentile (0..100) with linear interpolation."""
+    if not values:
+        return 0.0
+    s = sorted(values)
+    pos = (len(s) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (pos - lo)
+
+
+def latency_summary(seconds: list) -> dict:
+    """p50/p95/p99/mean in milliseconds."""
+    ms = [s * 1000 for s in seconds]
+    return {
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else 0.0,
+    }
+
+
+# ============================================================
+# ACCURACY
+# ============================================================
+def accuracy_report(truth: list, predicted: list) -> dict:
+    """
+    Top-1 accuracy, per-class recall and confusion counts.
+    confusion[true_label][predicted_label] = n (non-zero cells only).
+    """
+    confusion = {}
+    for t, p in zip(truth, predicted):
+        row = confusion.setdefault(t, {})
+        row[p] = row.get(p, 0) + 1
+
+    per_class = {}
+    for label, row in sorted(confusion.items()):
+        n = sum(row.values())
+        correct = row.get(label, 0)
+        per_class[label] = {"n": n, "correct": correct, "recall": round(correct / n, 4)}
+
+    correct = sum(t == p for t, p in zip(truth, predicted))
+    return {
+        "n": len(truth),
+        "top1": round(correct / len(truth), 4) if truth else 0.0,
+        "per_class": per_class,
+        "confusion": confusion,
+    }
+
+
+# ============================================================
+# MEMORY
+# ============================================================
+def peak_rss_mb() -> dict:
+    """
+    Peak RSS of this process and of its finished children (inference
+    workers count once they have exited).
+    """
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    return {"self_mb": round(own / 2**20, 1), "children_mb": round(children / 2**20, 1)}
@@ -0,0 +1,329 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+
+from core.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+DELIVERED, FAILED, BLOCKED = "delivered", "failed", "blocked"
+
+
+# ============================================================
+# SEND LIMITER (shared by everything that is not a reply)
+# ============================================================
+class SendLimiter:
+    """
+    Messages/second limit (Telegram allows ~30/s per bot), a minimum
+    interval per chat, and a pause after RetryAfter.
+
+    The limit is per process, so only one process may send non-reply
+    traffic: the one running start_background_jobs (polling process or
+    webhook ingress). Webhook workers only record broadcast jobs.
+    """
+
+    def __init__(self, rate: float = 25, per_chat_interval: float = 1.0):
+        self.bucket = TokenBucket(rate, burst=max(1, int(rate)))
+        self.per_chat_interval = float(per_chat_interval)
+        self._last_sent = {}    # chat_id -> monotonic time
+        self._paused_until = 0.0
+
+    async def wait(self, chat_id):
+        last = self._last_sent.get(chat_id)
+        if last is not None:
+            delay = self.per_chat_interval - (time.monotonic() - last)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+        await self.bucket.acquire()
+        self._last_sent[chat_id] = time.monotonic()
+
+        # Keep the per-chat table from growing forever
+        if len(self._last_sent) > 100000:
+            cutoff = time.monotonic() - self.per_chat_interval
+            self._last_sent = {c: t for c, t in self._last_sent.items() if t > cutoff}
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+async def send_limited(bot: Bot, limiter: SendLimiter, chat_id, text: str, **options) -> str:
+    """
+    Send one message under the limits. Return DELIVERED / FAILED / BLOCKED.
+    `options` go to send_message (e.g. parse_mode=None for plain text).
+    """
+    while True:
+        await limiter.wait(chat_id)
+        try:
+            await bot.send_message(chat_id, text, **options)
+            return DELIVERED
+        except TelegramRetryAfter as e:
+            logger.warning("Flood limit, pausing sends for %ss", e.retry_after)
+            limiter.pause(e.retry_after)
+        except TelegramForbiddenError:
+            return BLOCKED
+        except TelegramBadRequest as e:
+            logger.info("Send to %s failed: %s", chat_id, e)
+            return FAILED
+        except Exception:
+            logger.exception("Send to %s failed", chat_id)
+            return FAILED
+
+
+# ============================================================
+# RATE-LIMITED BROADCAST QUEUE (fire-and-forget, in memory)
+# ============================================================
+class BroadcastQueue:
+    """
+    Outgoing messages that are not replies and need no record
+    (e.g. weather alerts). A few sender tasks drain one queue.
+    """
+
+    def __init__(self, bot: Bot, limiter: SendLimiter, workers: int = 4, max_queue: int = 100000):
+        self.bot = bot
+        self.limiter = limiter
+        self.workers = max(1, int(workers))
+        self.max_queue = int(max_queue)
+
+        self._queue = None
+        self._tasks = []
+
+        self.sent = 0
+        self.failed = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._run()) for _ in range(self.workers)]
+
+    async def enqueue(self, chat_id, text: str):
+        self.start()
+        await self._queue.put((chat_id, text))
+
+    async def _run(self):
+        while True:
+            chat_id, text = await self._queue.get()
+            try:
+                if await send_limited(self.bot, self.limiter, chat_id, text) == DELIVERED:
+                    self.sent += 1
+                else:
+                    self.failed += 1
+            finally:
+                self._queue.task_done()
+
+
+# ============================================================
+# PERSISTENT BROADCAST JOBS
+# ============================================================
+class BroadcastStore:
+    """SQLite record of jobs and per-recipient status (the checkpoint)."""
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id       INTEGER PRIMARY KEY AUTOINCREMENT,
+                text     TEXT NOT NULL,
+                owner    TEXT,
+                created  REAL NOT NULL,
+                finished REAL
+            );
+            CREATE TABLE IF NOT EXISTS targets (
+                job_id  INTEGER NOT NULL,
+                chat_id TEXT NOT NULL,
+                status  TEXT,
+                PRIMARY KEY (job_id, chat_id)
+            );
+            CREATE INDEX IF NOT EXISTS targets_pending ON targets (job_id, status);
+        """)
+        self._db.commit()
+
+    def create_job(self, text: str, chat_ids, owner: str = None) -> int:
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "INSERT INTO jobs (text, owner, created) VALUES (?, ?, ?)", (text, owner, time.time())
+            )
+            job_id = cur.lastrowid
+            self._db.executemany(
+                "INSERT OR IGNORE INTO targets (job_id, chat_id) VALUES (?, ?)",
+                ((job_id, str(c)) for c in chat_ids)
+            )
+        return job_id
+
+    def job(self, job_id: int):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, text, owner, created, finished FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"id": row[0], "text": row[1], "owner": row[2], "created": row[3], "finished": row[4]}
+
+    def unfinished_jobs(self) -> list:
+        with self._lock:
+            rows = self._db.execute("SELECT id FROM jobs WHERE finished IS NULL ORDER BY id").fetchall()
+        return [r[0] for r in rows]
+
+    def recent_jobs(self, limit: int = 5) -> list:
+        with self._lock:
+            rows = self._db.execute("SELECT id FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [r[0] for r in rows]
+
+    def pending(self, job_id: int, limit: int) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT chat_id FROM targets WHERE job_id = ? AND status IS NULL LIMIT ?",
+                (job_id, limit)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def checkpoint(self, job_id: int, results: list):
+        """results: [(chat_id, status), ...]"""
+        with self._lock, self._db:
+            self._db.executemany(
+                "UPDATE targets SET status = ? WHERE job_id = ? AND chat_id = ?",
+                [(status, job_id, chat_id) for chat_id, status in results]
+            )
+
+    def finish(self, job_id: int):
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET finished = ? WHERE id = ?", (time.time(), job_id))
+
+    def counts(self, job_id: int) -> dict:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM targets WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall()
+        out = {"pending": 0, DELIVERED: 0, FAILED: 0, BLOCKED: 0}
+        for status, n in rows:
+            out[status or "pending"] = n
+        out["total"] = sum(out.values())
+        return out
+
+
+class BroadcastEngine:
+    """
+    Run broadcast jobs to completion, surviving restarts.
+
+    Recipients are sent in pages under the shared SendLimiter with
+    `workers` concurrent senders. Results are checkpointed to SQLite
+    every `checkpoint_every` messages, so after a restart `resume()`
+    continues with the recipients that are still pending (at most one
+    checkpoint worth of messages can be sent twice).
+
+    Jobs only run in the process that calls watch(); create() in any
+    other process just records the job, and the watcher picks it up.
+    Broadcast text is sent as plain text (admin input is not HTML).
+    """
+
+    PAGE = 1000
+
+    def __init__(self, bot: Bot, limiter: SendLimiter, db_path: str,
+                 workers: int = 20, checkpoint_every: int = 200, on_finish=None):
+        self.bot = bot
+        self.limiter = limiter
+        self.store = BroadcastStore(db_path)
+        self.workers = max(1, int(workers))
+        self.checkpoint_every = max(1, int(checkpoint_every))
+        self.on_finish = on_finish   # async (job: dict, counts: dict) -> None
+        self._running = {}
+        self._watching = False
+
+    async def create(self, text: str, chat_ids, owner: str = None) -> int:
+        job_id = await asyncio.to_thread(self.store.create_job, text, list(chat_ids), owner)
+        if self._watching:
+            self._start(job_id)
+        return job_id
+
+    async def watch(self, every: float = 5):
+        """Run unfinished jobs (including ones created by other processes)."""
+        self._watching = True
+        while True:
+            try:
+                await self.resume()
+            except Exception:
+                logger.exception("Broadcast job scan failed")
+            await asyncio.sleep(every)
+
+    async def resume(self):
+        for job_id in await asyncio.to_thread(self.store.unfinished_jobs):
+            if job_id not in self._running:
+                logger.info("Starting broadcast job %s", job_id)
+                self._start(job_id)
+
+    def _start(self, job_id: int):
+        if job_id not in self._running:
+            self._running[job_id] = asyncio.create_task(self._run(job_id))
+
+    async def counts(self, job_id: int) -> dict:
+        return await asyncio.to_thread(self.store.counts, job_id)
+
+    async def recent(self, limit: int = 5) -> list:
+        ids = await asyncio.to_thread(self.store.recent_jobs, limit)
+        return [(job_id, await self.counts(job_id)) for job_id in ids]
+
+    async def _run(self, job_id: int):
+        try:
+            job = await asyncio.to_thread(self.store.job, job_id)
+            started = time.monotonic()
+
+            while True:
+                chat_ids = await asyncio.to_thread(self.store.pending, job_id, self.PAGE)
+                if not chat_ids:
+                    break
+                await self._send_page(job_id, job["text"], chat_ids)
+
+            await asyncio.to_thread(self.store.finish, job_id)
+            counts = await self.counts(job_id)
+            logger.info("Broadcast job %s done in %.0fs: %s", job_id, time.monotonic() - started, counts)
+
+            if self.on_finish:
+                await self.on_finish(job, counts)
+        except Exception:
+            logger.exception("Broadcast job %s crashed", job_id)
+        finally:
+            self._running.pop(job_id, None)
+
+    async def _send_page(self, job_id: int, text: str, chat_ids: list):
+        queue = asyncio.Queue()
+        for chat_id in chat_ids:
+            queue.put_nowait(chat_id)
+
+        results = []
+
+        async def flush():
+            if results:
+                batch = results[:]
+                results.clear()
+                await asyncio.to_thread(self.store.checkpoint, job_id, batch)
+
+        async def sender():
+            while not queue.empty():
+                chat_id = queue.get_nowait()
+                try:
+                    status = await send_limited(self.bot, self.limiter, int(chat_id), text, parse_mode=None)
+                except Exception as e:
+                    # e.g. a non-numeric id: record it, do not abort the job
+                    logger.warning("Broadcast %s to %r failed: %s", job_id, chat_id, e)
+                    status = FAILED
+                results.append((chat_id, status))
+                if len(results) >= self.checkpoint_every:
+                    await flush()
+
+        await asyncio.gather(*(sender() for _ in range(min(self.workers, len(chat_ids)))))
+        await flush()
@@ -0,0 +1,78 @@
+import re
+
+from aiogram.filters import BaseFilter
+from aiogram.types import Message
+
+from core.language_manager import TRANSLATIONS, t as tr
+
+# ============================================================
+# MENU BUTTONS
+# action (translation key) -> icon shown in front of the label
+# ============================================================
+BUTTON_ICONS = {
+    "ask_question": "❓",
+    "send_photo": "📸",
+    "weather": "🌦",
+    "send_location_btn": "📍",
+    "report": "🛠",
+    "change_language": "🌐",
+    "weather_5": "5️⃣",
+    "weather_10": "🔟",
+    "weather_15": "1️⃣5️⃣",
+}
+
+# Sent as a location, never as text
+_NOT_TEXT = {"send_location_btn"}
+
+_APOSTROPHES = str.maketrans({c: "'" for c in "‘’ʻʼ`´"})
+
+
+def button_text(lang: str, action: str) -> str:
+    return f"{BUTTON_ICONS[action]} {tr(lang, action)}"
+
+
+def normalize_button(text: str) -> str:
+    return re.sub(r"\s+", " ", text.translate(_APOSTROPHES)).strip().casefold()
+
+
+def _build_index() -> dict:
+    """normalized text -> (action, lang), for both "<icon> label" and bare "label"."""
+    index = {}
+    for lang in TRANSLATIONS:
+        for action in BUTTON_ICONS:
+            if action in _NOT_TEXT:
+                continue
+            for variant in (button_text(lang, action), tr(lang, action)):
+                index.setdefault(normalize_button(variant), (action, lang))
+    return index
+
+
+BUTTON_INDEX = _build_index()
+
+
+def match_button(text: str):
+    """(action, lang) for a menu button text, else None."""
+    if not text:
+        return None
+    norm = normalize_button(text)
+    hit = BUTTON_INDEX.get(norm)
+    if hit is None and " " in norm:
+        # Keyboards sent before an icon change: drop the first token
+        hit = BUTTON_INDEX.get(norm.partition(" ")[2])
+    return hit
+
+
+class ButtonFilter(BaseFilter):
+    """
+    Match menu buttons by text alone (no profile lookup).
+    Injects `button` (action) and `button_lang` into the handler.
+    """
+
+    def __init__(self, *actions: str):
+        self.actions = set(actions)
+
+    async def __call__(self, message: Message):
+        hit = match_button(message.text)
+        if hit is None or (self.actions and hit[0] not in self.actions):
+            return False
+        return {"button": hit[0], "button_lang": hit[1]}
@@ -1,6 +1,8 @@
 import os
 import json
+import time
 import asyncio
+import logging
 from datetime import datetime
 
 from aiogram import Bot, Dispatcher, Router, F
@@ -10,21 +12,46 @@ from aiogram.types import (
     KeyboardButton,
     ReplyKeyboardMarkup
 )
-from aiogram.filters import CommandStart
+from aiogram.filters import CommandStart, Command
+from aiogram.fsm.context import FSMContext
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 
 # Core modules
-from core.language_manager import get_user_lang, set_user_lang, t as tr
-from core.user_manager import save_user, save_user_location, save_user_report
+from core.language_manager import t as tr
+from core.user_manager import (
+    save_user_async,
+    get_user_lang_async,
+    set_user_lang_async,
+    save_user_location_async,
+    get_user_location_async,
+    save_user_report_async,
+    all_user_ids
+)
+from core.loop_monitor import LoopLagMonitor
+from core.weather_alerts import alert_loop
+from bot.broadcast import SendLimiter, BroadcastQueue, BroadcastEngine
 from core.weather import get_weather, render_weather
 from core.gpt_client import (
     gpt_clean_text,
     gpt_predict_disease,
     gpt_crop_match,
-    gpt_yes_no,
     gpt_enrich_local_model,
-    topic_guard
+    gpt_answer_stream,
+    OFFTOPIC
+)
+from core.topic_guard import is_allowed_topic, quick_verdict, remember_verdict
+from core.predictor import (
+    analyze_image, has_leaf_head, local_model_available, warm_up, MODEL_CLASSES, CLASSES
 )
-from core.predictor import predict_disease, MODEL_CLASSES
+from core.knowledge import render_local_diagnosis, refresh_loop as knowledge_refresh_loop
+from core.leaf_detector import local_leaf_verdict, gpt_leaf_check
+from core.diagnosis_cache import DIAGNOSIS_CACHE, file_key, content_key
+from core.ingest import Photo, pick_photo_size, download_photo
+from core.vision import vision_stats
+from core.semantic_cache import ANSWER_CACHE
+from core.state_store import make_storage
+from bot.buttons import ButtonFilter, button_text
+from core.states import UserStates
 
 
 # ============================================================
@@ -35,11 +62,31 @@ bot = Bot(
     token=CFG["telegram_bot_token"],
     default=DefaultBotProperties(parse_mode="HTML")
 )
-dp = Dispatcher()
+# HTML is for our own templates. Answers (GPT, caches, knowledge base)
+# are plain text and always go out with parse_mode=None.
+# Conversation state lives outside the process so any worker can serve any chat
+dp = Dispatcher(storage=make_storage(CFG))
 rt = Router()
 dp.include_router(rt)
 
-USER_STATE = {}
+logger = logging.getLogger(__name__)
+
+# Local predictions above this OOD score go to GPT Vision instead
+OOD_THRESHOLD = CFG.get("ood_threshold", 0.6)
+
+# Every message that is not a direct reply shares these limits
+SEND_LIMITER = SendLimiter(
+    rate=CFG.get("broadcast_rate_per_sec", 25),
+    per_chat_interval=CFG.get("broadcast_per_chat_interval", 1.0),
+)
+BROADCAST = BroadcastQueue(bot, SEND_LIMITER)
+
+LOOP_MONITOR = LoopLagMonitor(warn_ms=CFG.get("loop_lag_warn_ms", 100))
+
+# One streamed completion does topic guard + answer
+COMBINED_ANSWER = CFG.get("combined_answer_mode", True)
+STREAM_EDIT_INTERVAL = CFG.get("stream_edit_interval", 1.0)
+TG_MAX_LEN = 4096
 
 
 # ============================================================
@@ -60,12 +107,12 @@ def language_keyboard():
 def main_menu(lang):
     return ReplyKeyboardMarkup(
         keyboard=[
-            [KeyboardButton(text=f"❓ {tr(lang, 'ask_question')}")],
-            [KeyboardButton(text=f"📸 {tr(lang, 'send_photo')}")],
-            [KeyboardButton(text=f"🌦 {tr(lang, 'weather')}")],
-            [KeyboardButton(text=f"📍 {tr(lang, 'send_location_btn')}", request_location=True)],
-            [KeyboardButton(text=f"🛠 {tr(lang, 'report')}")],
-            [KeyboardButton(text=f"🌐 {tr(lang, 'change_language')}")]
+            [KeyboardButton(text=button_text(lang, "ask_question"))],
+            [KeyboardButton(text=button_text(lang, "send_photo"))],
+            [KeyboardButton(text=button_text(lang, "weather"))],
+            [KeyboardButton(text=button_text(lang, "send_location_btn"), request_location=True)],
+            [KeyboardButton(text=button_text(lang, "report"))],
+            [KeyboardButton(text=button_text(lang, "change_language"))]
         ],
         resize_keyboard=True
     )
@@ -74,9 +121,9 @@ def main_menu(lang):
 def weather_days_keyboard(lang):
     return ReplyKeyboardMarkup(
         keyboard=[
-            [KeyboardButton(text=f"5️⃣ {tr(lang, 'weather_5')}")],
-            [KeyboardButton(text=f"🔟 {tr(lang, 'weather_10')}")],
-            [KeyboardButton(text=f"1️⃣5️⃣ {tr(lang, 'weather_15')}")]
+            [KeyboardButton(text=button_text(lang, "weather_5"))],
+            [KeyboardButton(text=button_text(lang, "weather_10"))],
+            [KeyboardButton(text=button_text(lang, "weather_15"))]
         ],
         resize_keyboard=True
     )
@@ -86,10 +133,10 @@ def weather_days_keyboard(lang):
 # START COMMAND
 # ============================================================
 @rt.message(CommandStart())
-async def start_cmd(msg: Message):
+async def start_cmd(msg: Message, state: FSMContext):
     user_id = str(msg.from_user.id)
-    save_user(user_id)
-    USER_STATE.pop(user_id, None)
+    await save_user_async(user_id)
+    await state.clear()
 
     await msg.answer(
         "Tilni tanlang / Выберите язык / Choose language:",
@@ -97,6 +144,89 @@ async def start_cmd(msg: Message):
     )
 
 
+# ============================================================
+# ADMIN STATS
+# ============================================================
+def is_admin(user_id: int) -> bool:
+    return user_id in CFG.get("admin_users", [])
+
+
+@rt.message(Command("stats"))
+async def stats_cmd(msg: Message):
+    if not is_admin(msg.from_user.id):
+        return
+
+    cache = DIAGNOSIS_CACHE.stats()
+    lag = LOOP_MONITOR.stats()
+    vision = vision_stats()
+    answers = ANSWER_CACHE.stats()
+    await msg.answer(
+        "<b>Diagnosis cache</b>\n"
+        f"hits: {cache['hits']} (disk: {cache['disk_hits']})\n"
+        f"misses: {cache['misses']}\n"
+        f"hit rate: {cache['hit_rate']}\n"
+        f"size: {cache['size']}\n\n"
+        "<b>Answer cache</b>\n"
+        f"hits: {answers['hits']}, misses: {answers['misses']}, "
+        f"hit rate: {answers['hit_rate']}, size: {answers['size']}\n\n"
+        "<b>Event loop lag</b>\n"
+        f"p50: {lag['p50_ms']} ms, p99: {lag['p99_ms']} ms, max: {lag['max_ms']} ms\n\n"
+        "<b>Vision calls</b>\n" + "\n".join(
+            f"{d}: {v['calls']} calls, {v['bytes'] // 1024} KB, {v['tokens']} tokens"
+            for d, v in vision.items()
+        )
+    )
+
+
+# ============================================================
+# ADMIN BROADCAST
+# ============================================================
+def _job_line(job_id: int, counts: dict) -> str:
+    return (
+        f"#{job_id}: {counts['delivered']}/{counts['total']} delivered, "
+        f"{counts['failed']} failed, {counts['blocked']} blocked, {counts['pending']} pending"
+    )
+
+
+async def _broadcast_finished(job: dict, counts: dict):
+    if job.get("owner"):
+        await BROADCAST.enqueue(int(job["owner"]), "✅ Broadcast done\n" + _job_line(job["id"], counts))
+
+
+BROADCAST_JOBS = BroadcastEngine(
+    bot,
+    SEND_LIMITER,
+    CFG.get("broadcast_db", "users/broadcast.db"),
+    workers=CFG.get("broadcast_workers", 20),
+    checkpoint_every=CFG.get("broadcast_checkpoint_every", 200),
+    on_finish=_broadcast_finished,
+)
+
+
+@rt.message(Command("send"))
+async def send_cmd(msg: Message):
+    if not is_admin(msg.from_user.id):
+        return
+
+    text = (msg.text or "").partition(" ")[2].strip()
+    if not text:
+        await msg.answer("Usage: /send <text>")
+        return
+
+    recipients = await asyncio.to_thread(all_user_ids)
+    job_id = await BROADCAST_JOBS.create(text, recipients, owner=str(msg.from_user.id))
+    await msg.answer(f"📣 Broadcast #{job_id} queued for {len(recipients)} users")
+
+
+@rt.message(Command("jobs"))
+async def jobs_cmd(msg: Message):
+    if not is_admin(msg.from_user.id):
+        return
+
+    jobs = await BROADCAST_JOBS.recent()
+    await msg.answer("\n".join(_job_line(j, c) for j, c in jobs) or "No broadcasts yet")
+
+
 # ============================================================
 # LANGUAGE SELECTION
 # ============================================================
@@ -109,12 +239,12 @@ LANG_MAP = {
 
 
 @rt.message(F.text.in_(LANG_MAP.keys()))
-async def choose_language(msg: Message):
+async def choose_language(msg: Message, state: FSMContext):
     user_id = str(msg.from_user.id)
     lang = LANG_MAP[msg.text]
 
-    set_user_lang(user_id, lang)
-    USER_STATE.pop(user_id, None)
+    await set_user_lang_async(user_id, lang)
+    await state.clear()
 
     await msg.answer(tr(lang, "welcome"), reply_markup=main_menu(lang))
 
@@ -122,7 +252,7 @@ async def choose_language(msg: Message):
 # ============================================================
 # CHANGE LANGUAGE BUTTON
 # ============================================================
-@rt.message(lambda m: m.text and tr(get_user_lang(str(m.from_user.id)), "change_language") in m.text)
+@rt.message(ButtonFilter("change_language"))
 async def change_language_btn(msg: Message):
     await msg.answer(
         "Tilni tanlang / Выберите язык / Choose language:",
@@ -136,9 +266,9 @@ async def change_language_btn(msg: Message):
 @rt.message(F.location)
 async def save_location_handler(msg: Message):
     user_id = str(msg.from_user.id)
-    lang = get_user_lang(user_id)
+    lang = await get_user_lang_async(user_id)
 
-    save_user_location(user_id, msg.location.latitude, msg.location.longitude)
+    await save_user_location_async(user_id, msg.location.latitude, msg.location.longitude)
 
     await msg.answer(
         tr(lang, "location_saved"),
@@ -147,83 +277,104 @@ async def save_location_handler(msg: Message):
 
 
 # ============================================================
-# MAIN MESSAGE ROUTER (TEXT)
+# MENU BUTTONS
+# Matched by text through the precompiled index; the button's
+# language is the user's keyboard language, so no profile read.
 # ============================================================
-@rt.message(F.text)
-async def menu_router(msg: Message):
+WEATHER_DAYS = {"weather_5": 5, "weather_10": 10, "weather_15": 15}
+
+
+@rt.message(ButtonFilter())
+async def button_router(msg: Message, state: FSMContext, button: str, button_lang: str):
     user_id = str(msg.from_user.id)
-    lang = get_user_lang(user_id)
-    text = msg.text.strip()
+    lang = button_lang
 
-    # ----------------------------
-    # WEATHER
-    # ----------------------------
-    if text.endswith(tr(lang, "weather")):
-        USER_STATE[user_id] = {"weather": True}
+    if button == "weather":
+        await state.set_state(UserStates.weather_days)
         return await msg.answer(tr(lang, "weather_choose_days"), reply_markup=weather_days_keyboard(lang))
 
-    # Weather day selection
-    if USER_STATE.get(user_id, {}).get("weather"):
-        if text.endswith(tr(lang, "weather_5")):
-            days = 5
-        elif text.endswith(tr(lang, "weather_10")):
-            days = 10
-        elif text.endswith(tr(lang, "weather_15")):
-            days = 15
-        else:
-            return
-
-        data = json.load(open(f"users/{user_id}/user.json"))
-        loc = data.get("location")
+    if button in WEATHER_DAYS:
+        days = WEATHER_DAYS[button]
+        await state.clear()
+
+        loc = await get_user_location_async(user_id)
         if not loc:
-            USER_STATE.pop(user_id, None)
             return await msg.answer(tr(lang, "location_not_set"), reply_markup=main_menu(lang))
 
-        weather = get_weather(loc["lat"], loc["lon"], days)
+        weather = await get_weather(loc["lat"], loc["lon"], days)
         if not weather:
-            USER_STATE.pop(user_id, None)
             return await msg.answer(tr(lang, "weather_error"), reply_markup=main_menu(lang))
 
-        forecast = render_weather(weather, days, lang)
-        USER_STATE.pop(user_id, None)
-        return await msg.answer(forecast, reply_markup=main_menu(lang))
+        return await msg.answer(render_weather(weather, days, lang), reply_markup=main_menu(lang))
 
-    # ----------------------------
-    # SEND PHOTO
-    # ----------------------------
-    if text.endswith(tr(lang, "send_photo")):
-        USER_STATE[user_id] = {"awaiting_crop": True}
+    if button == "send_photo":
+        await state.set_state(UserStates.ask_plant_name)
         return await msg.answer(tr(lang, "ask_crop_name_first"))
 
+    if button == "report":
+        await state.set_state(UserStates.report)
+        return await msg.answer(tr(lang, "report_prompt"))
+
+    if button == "ask_question":
+        return await msg.answer(tr(lang, "ask_question_prompt"))
+
+
+# ============================================================
+# MAIN MESSAGE ROUTER (TEXT)
+# ============================================================
+@rt.message(F.text)
+async def menu_router(msg: Message, state: FSMContext):
+    user_id = str(msg.from_user.id)
+    lang = await get_user_lang_async(user_id)
+    text = msg.text.strip()
+    current = await state.get_state()
+
+    # Waiting for a day button; ignore other text
+    if current == UserStates.weather_days.state:
+        return
+
     # Crop name input
-    if USER_STATE.get(user_id, {}).get("awaiting_crop"):
+    if current == UserStates.ask_plant_name.state:
         match = await gpt_crop_match(text.lower(), MODEL_CLASSES)
-        USER_STATE[user_id]["crop_name"] = match or text.lower()
-        USER_STATE[user_id]["awaiting_crop"] = False
+        await state.set_state(UserStates.send_photo)
+        await state.set_data({"crop_name": match or text.lower()})
         return await msg.answer(tr(lang, "send_photo_now"))
 
+    # Report text
+    if current == UserStates.report.state:
+        await save_user_report_async(user_id, text)
+        await state.clear()
+        return await msg.answer(tr(lang, "report_success"), reply_markup=main_menu(lang))
+
     # ----------------------------
-    # REPORT
+    # SEMANTIC ANSWER CACHE
+    # Only agricultural answers are stored, so a hit skips the guard too
     # ----------------------------
-    if text.endswith(tr(lang, "report")):
-        USER_STATE[user_id] = {"report": True}
-        return await msg.answer(tr(lang, "report_prompt"))
-
-    if USER_STATE.get(user_id, {}).get("report"):
-        save_user_report(user_id, text)
-        USER_STATE.pop(user_id, None)
-        return await msg.answer(tr(lang, "report_success"), reply_markup=main_menu(lang))
+    cached = await ANSWER_CACHE.lookup(text, lang)
+    if cached:
+        return await msg.answer(cached, parse_mode=None)
 
     # ----------------------------
-    # ASK QUESTION
+    # COMBINED: TOPIC GUARD + STREAMED ANSWER
     # ----------------------------
-    if text.endswith(tr(lang, "ask_question")):
-        return await msg.answer(tr(lang, "ask_question_prompt"))
+    if COMBINED_ANSWER:
+        verdict = quick_verdict(text)
+        if verdict is False:
+            return await msg.answer(tr(lang, "topic_not_agriculture"))
+
+        answer = await stream_reply(msg, gpt_answer_stream(text, lang))
+        if answer is None:
+            remember_verdict(text, False)
+            return await msg.answer(tr(lang, "topic_not_agriculture"))
+
+        remember_verdict(text, True)
+        await ANSWER_CACHE.store(text, lang, answer)
+        return
 
     # ----------------------------
     # TOPIC GUARD (Important)
     # ----------------------------
-    is_agro = await topic_guard(text)
+    is_agro = await is_allowed_topic(text)
     if not is_agro:
         return await msg.answer(tr(lang, "topic_not_agriculture"))
 
@@ -231,55 +382,242 @@ async def menu_router(msg: Message):
     # DEFAULT GPT TEXT ANSWER
     # ----------------------------
     resp = await gpt_clean_text(text, lang)
-    return await msg.answer(resp)
+    await ANSWER_CACHE.store(text, lang, resp)
+    return await msg.answer(resp, parse_mode=None)
+
+
+# ============================================================
+# STREAMED REPLIES
+# ============================================================
+async def _edit(sent: Message, text: str) -> bool:
+    try:
+        await sent.edit_text(text[:TG_MAX_LEN], parse_mode=None)
+        return True
+    except TelegramRetryAfter:
+        return False  # too many edits; the next tick will catch up
+    except TelegramBadRequest:
+        return True  # "message is not modified"
+
+
+async def stream_reply(msg: Message, pieces):
+    """
+    Show a streamed answer progressively: send the first text as soon as
+    it arrives, then edit the message at most every STREAM_EDIT_INTERVAL
+    seconds. Return the full text, or None if the model refused (OFFTOPIC).
+    """
+    sent = None
+    text = ""
+    shown = ""
+    last_edit = 0.0
+
+    async for piece in pieces:
+        if piece == OFFTOPIC:
+            return None
+
+        text += piece
+        now = time.monotonic()
+
+        if sent is None:
+            sent = await msg.answer(text[:TG_MAX_LEN], parse_mode=None)
+            shown, last_edit = text, now
+        elif now - last_edit >= STREAM_EDIT_INTERVAL and text != shown:
+            if await _edit(sent, text):
+                shown = text
+            last_edit = now
+
+    if sent is None:
+        await msg.answer(text or "…", parse_mode=None)
+    elif text != shown:
+        await _edit(sent, text)
+
+    return text
+
+
+# ============================================================
+# PHOTO PIPELINE
+# ============================================================
+async def _timed(timings: dict, stage: str, coro):
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[stage] = round((time.perf_counter() - start) * 1000)
+
+
+async def _done(value):
+    return value
+
+
+async def _vision_answer(photo: Photo, crop_name, lang):
+    result = await gpt_predict_disease(photo.data, crop_name, lang)
+    return await gpt_clean_text(result, lang)
+
+
+async def _leaf_gpt(photo: Photo, lang):
+    return await gpt_leaf_check(photo.data, tr(lang, "leaf_prompt"))
+
+
+async def diagnose_photo(photo: Photo, crop_name: str, lang: str):
+    """
+    Run the photo stages speculatively in parallel:
+    - local analysis and the leaf gate start together
+    - GPT Vision for non-model crops starts together with the leaf gate
+    - enrichment for the local top-1 starts as soon as logits are ready
+    Everything still running is cancelled if the leaf gate says NO.
+    If the local model fails, GPT vision and the GPT leaf gate answer.
+    Return the answer text, or None if the photo is not a plant.
+    """
+    timings = {}
+    tasks = []
+    start = time.perf_counter()
+
+    def spawn(stage, coro):
+        task = asyncio.create_task(_timed(timings, stage, coro))
+        tasks.append(task)
+        return task
+
+    try:
+        # The local pass serves model crops and the leaf head; a non-model
+        # crop without a leaf head is answered by GPT alone.
+        # A declared model crop restricts the local classifier to its classes
+        local = None
+        if local_model_available() and (crop_name in MODEL_CLASSES or has_leaf_head()):
+            local = spawn("local", analyze_image(photo.data, crop_name))
+
+        # Without a local leaf score GPT decides anyway, so ask it right away
+        leaf_gpt = None
+        if local is None or not has_leaf_head():
+            leaf_gpt = spawn("leaf_gpt", _leaf_gpt(photo, lang))
+
+        answer_task = None
+        if crop_name not in MODEL_CLASSES:
+            answer_task = spawn("vision", _vision_answer(photo, crop_name, lang))
+
+        analysis = None
+        if local is not None:
+            try:
+                analysis = await local
+            except Exception:
+                logger.exception("Local analysis failed, falling back to GPT")
+
+        if answer_task is None:
+            if analysis is not None and analysis["ood"] < OOD_THRESHOLD:
+                # Precomputed knowledge base first; GPT only if the entry is missing
+                text = render_local_diagnosis(
+                    analysis["raw"], analysis["crop"], analysis["confidence"], lang
+                )
+                if text is None:
+                    answer_task = spawn("enrich", gpt_enrich_local_model(
+                        analysis["disease"], analysis["crop"], analysis["confidence"], lang
+                    ))
+                else:
+                    answer_task = spawn("knowledge", _done(text))
+            else:
+                # Photo does not look like any local class (or no local result)
+                answer_task = spawn("vision", _vision_answer(photo, crop_name, lang))
+
+        # Leaf gate: local score first, GPT only when unsure
+        is_leaf = local_leaf_verdict(analysis["leaf"]) if analysis is not None else None
+        if is_leaf is None:
+            if leaf_gpt is None:
+                leaf_gpt = spawn("leaf_gpt", _leaf_gpt(photo, lang))
+            is_leaf = await leaf_gpt
+
+        if not is_leaf:
+            return None
+
+        return await answer_task
+
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        timings["total"] = round((time.perf_counter() - start) * 1000)
+        logger.info("Photo pipeline (%s) stage ms: %s", crop_name, timings)
 
 
 # ============================================================
 # PHOTO HANDLER
 # ============================================================
 @rt.message(F.photo)
-async def photo_handler(msg: Message):
+async def photo_handler(msg: Message, state: FSMContext):
     user_id = str(msg.from_user.id)
-    lang = get_user_lang(user_id)
+    lang = await get_user_lang_async(user_id)
 
-    if "crop_name" not in USER_STATE.get(user_id, {}):
+    flow = await state.get_data()
+    if await state.get_state() != UserStates.send_photo.state or "crop_name" not in flow:
         return await msg.answer(tr(lang, "please_first_type_crop"))
 
-    crop_name = USER_STATE[user_id]["crop_name"]
+    crop_name = flow["crop_name"]
+
+    # Smallest version that still serves the model and vision calls
+    size = pick_photo_size(msg.photo)
+
+    # Same Telegram file already diagnosed → answer without downloading
+    fid_key = file_key(size.file_unique_id, crop_name, lang)
+    # A miss here is not counted: the content key below decides
+    cached = await DIAGNOSIS_CACHE.lookup(fid_key, count_miss=False)
+    if cached:
+        await state.clear()
+        return await msg.answer(cached, parse_mode=None)
 
     await msg.answer(tr(lang, "photo_analyzing"))
 
-    # Download image
-    file_id = msg.photo[-1].file_id
-    file = await bot.get_file(file_id)
-    img_data = (await bot.download_file(file.file_path)).read()
+    photo = await download_photo(bot, size)
+    logger.info("Photo %dx%d, %d bytes", size.width, size.height, photo.size)
 
-    # Check if plant
-    ok = await gpt_yes_no(tr(lang, "leaf_prompt"), img_data)
-    if ok != "YES":
-        USER_STATE.pop(user_id, None)
-        return await msg.answer(tr(lang, "not_leaf"))
+    # Same picture uploaded again under a new file id
+    sha_key = content_key(photo.data, crop_name, lang)
+    cached = await DIAGNOSIS_CACHE.lookup(sha_key)
+    if cached:
+        DIAGNOSIS_CACHE.put(fid_key, cached)
+        await state.clear()
+        return await msg.answer(cached, parse_mode=None)
 
-    # Local model
-    if crop_name in MODEL_CLASSES:
-        pred = await predict_disease(img_data)
-        enriched = await gpt_enrich_local_model(
-            pred["disease"], pred["crop"], pred["confidence"], lang
-        )
-        USER_STATE.pop(user_id, None)
-        return await msg.answer(enriched)
+    answer = await diagnose_photo(photo, crop_name, lang)
+    if answer is None:
+        await state.clear()
+        return await msg.answer(tr(lang, "not_leaf"))
 
-    # GPT Vision fallback
-    result = await gpt_predict_disease(img_data, crop_name, lang)
-    cleaned = await gpt_clean_text(result, lang)
+    DIAGNOSIS_CACHE.put(sha_key, answer)
+    DIAGNOSIS_CACHE.put(fid_key, answer)
 
-    USER_STATE.pop(user_id, None)
-    await msg.answer(cleaned)
+    await state.clear()
+    await msg.answer(answer, parse_mode=None)
 
 
 # ============================================================
 # RUN BOT
 # ============================================================
+async def start_background_jobs():
+    """Broadcasts, alerts and knowledge refresh (one process only)."""
+    # Only this process sends broadcasts, so SEND_LIMITER is the only limiter
+    asyncio.create_task(BROADCAST_JOBS.watch(CFG.get("broadcast_scan_seconds", 5)))
+
+    if CFG.get("weather_alerts_enabled", False):
+        asyncio.create_task(alert_loop(
+            BROADCAST.enqueue,
+            CFG.get("weather_alert_every_hours", 6),
+            CFG.get("weather_alert_days", 3),
+        ))
+
+    refresh_hours = CFG.get("knowledge_refresh_hours", 0)
+    if refresh_hours:
+        asyncio.create_task(knowledge_refresh_loop(
+            CLASSES, refresh_hours, CFG.get("knowledge_max_age_days", 30)
+        ))
+
+
+def start_inference_warmup():
+    """Load (and check) the model now instead of on the first photo (inference_warmup)."""
+    if CFG.get("inference_warmup", True):
+        asyncio.create_task(warm_up())
+
+
 async def run_bot():
     print("AgroYordamchi is running...")
+    LOOP_MONITOR.start()
+    start_inference_warmup()
+    asyncio.create_task(ANSWER_CACHE.save_loop())
+    await start_background_jobs()
     await dp.start_polling(bot)
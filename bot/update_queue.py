@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# DURABLE UPDATE QUEUE (webhook ingress -> worker processes)
+# ============================================================
+class UpdateQueue:
+    """
+    SQLite-backed queue of raw Telegram updates.
+
+    Ordering: only the oldest update of each chat can be claimed, and a
+    chat is skipped while that update is leased by a worker. Different
+    chats are processed in parallel; one chat's updates never are.
+
+    Sharding: claim(worker=i, workers=n) only sees chats whose shard
+    (crc32 of the chat id) is i mod n, so a chat always lands on the
+    same worker process and its per-process caches (user profiles,
+    FSM memory) never go stale against another worker.
+
+    A claimed update is deleted on ack(). The worker renew()s the
+    leases of updates it is still handling, so a long handler is never
+    claimed twice. If the worker dies, the lease expires and the
+    restarted worker for that shard retries it (up to `max_attempts`).
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 120, max_attempts: int = 3):
+        self.db_path = db_path
+        self.lease_seconds = float(lease_seconds)
+        self.max_attempts = max(1, int(max_attempts))
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS updates (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                update_id   INTEGER UNIQUE,
+                chat_id     TEXT NOT NULL,
+                payload     TEXT NOT NULL,
+                lease_until REAL NOT NULL DEFAULT 0,
+                attempts    INTEGER NOT NULL DEFAULT 0,
+                shard       INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS updates_chat ON updates (chat_id, id);
+        """)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(updates)")}
+        if "shard" not in columns:
+            self._db.execute("ALTER TABLE updates ADD COLUMN shard INTEGER NOT NULL DEFAULT 0")
+
+    def put(self, update: dict, chat_id) -> bool:
+        """Enqueue a raw update. Telegram re-deliveries (same update_id) are ignored."""
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO updates (update_id, chat_id, payload, shard) VALUES (?, ?, ?, ?)",
+                (update.get("update_id"), str(chat_id), json.dumps(update, ensure_ascii=False),
+                 zlib.crc32(str(chat_id).encode()))
+            )
+        return cur.rowcount > 0
+
+    def claim(self, limit: int = 16, worker: int = 0, workers: int = 1, skip=()) -> list:
+        """
+        Lease up to `limit` updates of this worker's shard, each from a
+        different chat, except the ids in `skip` (still being handled).
+        Return [(id, update)].
+        """
+        now = time.time()
+        skip = set(skip)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute("""
+                    SELECT id, payload, attempts FROM updates
+                    WHERE id IN (SELECT MIN(id) FROM updates WHERE shard % ? = ? GROUP BY chat_id)
+                      AND lease_until < ?
+                    ORDER BY id
+                    LIMIT ?
+                """, (workers, worker, now, limit)).fetchall()
+
+                claimed, dropped = [], []
+                for row_id, payload, attempts in rows:
+                    if row_id in skip:
+                        continue
+                    if attempts >= self.max_attempts:
+                        dropped.append((row_id,))
+                    else:
+                        claimed.append((row_id, payload))
+
+                self._db.executemany(
+                    "UPDATE updates SET lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                    [(now + self.lease_seconds, row_id) for row_id, _ in claimed]
+                )
+                self._db.executemany("DELETE FROM updates WHERE id = ?", dropped)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+        if dropped:
+            logger.error("Dropped %d updates after %d failed attempts", len(dropped), self.max_attempts)
+        return [(row_id, json.loads(payload)) for row_id, payload in claimed]
+
+    def renew(self, row_ids):
+        """Extend the leases of updates that are still being handled."""
+        until = time.time() + self.lease_seconds
+        with self._lock:
+            self._db.executemany(
+                "UPDATE updates SET lease_until = ? WHERE id = ?", [(until, i) for i in row_ids]
+            )
+
+    def ack(self, row_id: int):
+        with self._lock:
+            self._db.execute("DELETE FROM updates WHERE id = ?", (row_id,))
+
+    def release(self, row_id: int):
+        """Give an update back for an immediate retry (it keeps its attempt count)."""
+        with self._lock:
+            self._db.execute("UPDATE updates SET lease_until = 0 WHERE id = ?", (row_id,))
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM updates").fetchone()[0]
@@ -0,0 +1,198 @@
+"""
+Webhook mode: one ingress process + N worker processes.
+
+    Telegram ──POST──► ingress (aiohttp) ──► UpdateQueue (SQLite) ──► workers ──► dp.feed_update
+
+The ingress only validates and stores updates, so it answers Telegram
+in a few milliseconds. Workers claim updates with per-chat ordering
+(see UpdateQueue) and share conversation state through the FSM storage
+configured on the Dispatcher. Each chat is pinned to one worker (by
+shard), so per-process caches such as the user profile store stay
+consistent. Background jobs (broadcast resume,
+weather alerts, knowledge refresh) run in the ingress process.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+
+from aiohttp import web
+
+from config import CFG
+from bot.update_queue import UpdateQueue
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DB = CFG.get("update_queue_db", "users/updates.db")
+WEBHOOK_URL = CFG.get("webhook_url", "")            # public base URL, e.g. https://bot.example.com
+WEBHOOK_PATH = CFG.get("webhook_path", "/telegram")
+WEBHOOK_SECRET = CFG.get("webhook_secret", "")
+WEBHOOK_HOST = CFG.get("webhook_host", "0.0.0.0")
+WEBHOOK_PORT = CFG.get("webhook_port", 8080)
+
+WORKERS = CFG.get("webhook_workers", 2)
+WORKER_CONCURRENCY = CFG.get("webhook_worker_concurrency", 16)
+LEASE_SECONDS = CFG.get("update_lease_seconds", 120)
+POLL_INTERVAL = 0.05
+
+
+def _queue() -> UpdateQueue:
+    return UpdateQueue(QUEUE_DB, lease_seconds=LEASE_SECONDS)
+
+
+def chat_of(update: dict):
+    """Ordering key of an update: its chat id, else the sender id."""
+    for field in ("message", "edited_message", "channel_post", "edited_channel_post",
+                  "my_chat_member", "chat_member", "chat_join_request"):
+        if field in update:
+            return update[field]["chat"]["id"]
+
+    callback = update.get("callback_query")
+    if callback and callback.get("message"):
+        return callback["message"]["chat"]["id"]
+
+    for value in update.values():
+        if isinstance(value, dict) and "from" in value:
+            return value["from"]["id"]
+    return f"update:{update.get('update_id')}"
+
+
+# ============================================================
+# INGRESS (aiohttp)
+# ============================================================
+async def handle_update(request: web.Request) -> web.Response:
+    if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        return web.Response(status=401)
+
+    try:
+        update = await request.json()
+    except Exception:
+        return web.Response(status=400)
+
+    await asyncio.to_thread(request.app["queue"].put, update, chat_of(update))
+    return web.Response()
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    alive = sum(p.is_alive() for p in request.app["workers"])
+    depth = await asyncio.to_thread(request.app["queue"].depth)
+    return web.json_response(
+        {"ok": alive > 0, "workers_alive": alive, "queue_depth": depth},
+        status=200 if alive > 0 else 503
+    )
+
+
+def build_app(queue: UpdateQueue, workers: list) -> web.Application:
+    app = web.Application()
+    app["queue"] = queue
+    app["workers"] = workers
+    app.router.add_post(WEBHOOK_PATH, handle_update)
+    app.router.add_get("/health", handle_health)
+    return app
+
+
+# ============================================================
+# WORKERS
+# ============================================================
+async def _handle(queue: UpdateQueue, bot, dp, row_id: int, raw: dict):
+    from aiogram.types import Update
+
+    try:
+        await dp.feed_update(bot, Update.model_validate(raw, context={"bot": bot}))
+    except Exception:
+        # Replies may already be out; retrying would duplicate them
+        logger.exception("Update %s failed", raw.get("update_id"))
+    finally:
+        await asyncio.to_thread(queue.ack, row_id)
+
+
+async def _heartbeat(queue: UpdateQueue, running: dict):
+    """Keep the leases of in-flight updates alive (handlers may outlive one lease)."""
+    while True:
+        await asyncio.sleep(LEASE_SECONDS / 3)
+        if running:
+            try:
+                await asyncio.to_thread(queue.renew, list(running))
+            except Exception as e:
+                logger.warning("Lease renewal failed: %s", e)
+
+
+async def consume(index: int):
+    from bot.telegram_bot import bot, dp, LOOP_MONITOR, start_inference_warmup
+    from core.semantic_cache import ANSWER_CACHE
+
+    queue = _queue()
+    LOOP_MONITOR.start()
+    start_inference_warmup()
+    # Each worker owns its chats' answer cache and saves it to its own file
+    root, ext = os.path.splitext(ANSWER_CACHE.path)
+    ANSWER_CACHE.path = f"{root}.worker{index}{ext}"
+    asyncio.create_task(ANSWER_CACHE.save_loop())
+    running = {}   # row id -> task
+    asyncio.create_task(_heartbeat(queue, running))
+
+    while True:
+        free = WORKER_CONCURRENCY - len(running)
+        batch = (await asyncio.to_thread(queue.claim, free, index, WORKERS, list(running))
+                 if free > 0 else [])
+
+        for row_id, raw in batch:
+            task = asyncio.create_task(_handle(queue, bot, dp, row_id, raw))
+            running[row_id] = task
+            task.add_done_callback(lambda _, row_id=row_id: running.pop(row_id, None))
+
+        if not batch:
+            await asyncio.sleep(POLL_INTERVAL)
+
+
+def worker_main(index: int):
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Update worker %d started", index)
+    asyncio.run(consume(index))
+
+
+def _spawn_worker(index: int):
+    # Not daemonic: workers start their own inference pool processes
+    proc = multiprocessing.get_context("spawn").Process(
+        target=worker_main, args=(index,), name=f"update-worker-{index}"
+    )
+    proc.start()
+    return proc
+
+
+# ============================================================
+# RUN
+# ============================================================
+async def run_webhook():
+    from bot.telegram_bot import bot, dp, start_background_jobs
+
+    # Importing the bot above also ran the one-time user migration,
+    # so workers start against a migrated store
+    queue = _queue()
+    workers = [_spawn_worker(i) for i in range(WORKERS)]
+
+    runner = web.AppRunner(build_app(queue, workers))
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+
+    await bot.set_webhook(
+        WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET or None,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    await start_background_jobs()
+    print(f"AgroYordamchi webhook on :{WEBHOOK_PORT}{WEBHOOK_PATH} with {WORKERS} workers")
+
+    try:
+        # Supervise: restart workers that died
+        while True:
+            await asyncio.sleep(5)
+            for i, proc in enumerate(workers):
+                if not proc.is_alive():
+                    logger.warning("Update worker %d exited (%s), restarting", i, proc.exitcode)
+                    workers[i] = _spawn_worker(i)
+    finally:
+        await runner.cleanup()
+        for proc in workers:
+            proc.terminate()
+            proc.join(timeout=10)
@@ -0,0 +1,41 @@
+"""
+Build the multilingual disease knowledge base for the local model labels.
+
+Creates/updates config["knowledge_path"] (disease_model/knowledge.json)
+with one entry per (label, language). At runtime local-model diagnoses
+are rendered from it with zero LLM calls.
+
+Usage:
+    python build_knowledge.py                  # only missing entries
+    python build_knowledge.py --max-age-days 30
+    python build_knowledge.py --force --langs uz,ru
+"""
+import argparse
+import asyncio
+import logging
+
+from core.knowledge import build_knowledge, KNOWLEDGE_PATH, LANGUAGES
+from core.predictor import CLASSES
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--langs", default=",".join(LANGUAGES))
+    ap.add_argument("--max-age-days", type=float, default=None)
+    ap.add_argument("--force", action="store_true")
+    ap.add_argument("--out", default=KNOWLEDGE_PATH)
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    max_age = args.max_age_days * 86400 if args.max_age_days is not None else None
+    data = asyncio.run(build_knowledge(
+        CLASSES, args.langs.split(","), max_age=max_age, force=args.force, path=args.out
+    ))
+
+    total = sum(len(v) for v in data["entries"].values())
+    print(f"Saved {total} entries to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
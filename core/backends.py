@@ -0,0 +1,136 @@
+import logging
+import os
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("eager", "torchscript", "int8_linear", "onnx")
+# Old name of int8_linear; it never quantized the convolutions
+_ALIASES = {"int8": "int8_linear"}
+
+
+# ============================================================
+# FUSED MODULE
+# One call returns what analyze_batch needs from the network:
+# the pooled embedding (for the leaf head) and the class logits.
+# ============================================================
+class FusedNet(torch.nn.Module):
+    def __init__(self, net):
+        super().__init__()
+        self.net = net
+
+    def forward(self, x):
+        emb = self.net.forward_head(self.net.forward_features(x), pre_logits=True)
+        return emb, self.net.get_classifier()(emb)
+
+
+def example_input(batch: int = 1):
+    return torch.randn(batch, 3, 224, 224)
+
+
+# ============================================================
+# BACKENDS
+# All are callables: float32 NCHW tensor -> (embedding, logits)
+# ============================================================
+class TorchBackend:
+    """Eager, TorchScript and quantized modules."""
+
+    def __init__(self, name: str, module):
+        self.name = name
+        self.module = module
+
+    def __call__(self, x):
+        with torch.inference_mode():
+            return self.module(x)
+
+
+class OnnxBackend:
+    """ONNX Runtime on CPU."""
+
+    name = "onnx"
+
+    def __init__(self, path: str, threads: int = 1):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("inference_backend 'onnx' needs onnxruntime: pip install onnxruntime")
+
+        if not os.path.exists(path):
+            raise RuntimeError(f"{path} not found; run: python export_model.py --onnx")
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = max(1, int(threads))
+        opts.inter_op_num_threads = 1
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x):
+        emb, logits = self.session.run(None, {self.input_name: x.numpy()})
+        return torch.from_numpy(emb), torch.from_numpy(logits)
+
+
+# ============================================================
+# BUILD / EXPORT
+# ============================================================
+def trace_frozen(module, batch: int = 8):
+    """TorchScript trace + freeze (constant-folds weights, fuses conv/bn)."""
+    with torch.no_grad():
+        traced = torch.jit.trace(module.eval(), example_input(batch))
+        return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+
+def quantize_int8(module):
+    """
+    Dynamic INT8 quantization of the Linear layers only (classifier and
+    squeeze-excite projections); the convolutions, where almost all the
+    compute is, stay fp32. For INT8 convolutions use export_model.py
+    --onnx-int8 with the onnx backend.
+    """
+    return torch.ao.quantization.quantize_dynamic(module.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_onnx(module, path: str, opset: int = 17):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            module.eval(), example_input(1), path,
+            input_names=["input"], output_names=["embedding", "logits"],
+            dynamic_axes={"input": {0: "batch"}, "embedding": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=opset,
+        )
+
+
+def _load_script(path: str, build):
+    """Load a TorchScript artifact, or build it in memory if it was not exported."""
+    if os.path.exists(path):
+        return torch.jit.load(path, map_location="cpu")
+    logger.warning("%s not found, building it in memory (run export_model.py to skip this)", path)
+    return build()
+
+
+def create_backend(kind: str, load_net, cfg: dict, threads: int = 1):
+    """
+    kind: eager | torchscript | int8_linear | onnx
+    load_net: () -> eager timm model (only called when needed)
+    """
+    if kind in _ALIASES:
+        logger.warning("inference_backend '%s' is deprecated, use '%s'", kind, _ALIASES[kind])
+        kind = _ALIASES[kind]
+
+    if kind == "eager":
+        return TorchBackend(kind, FusedNet(load_net()))
+
+    if kind == "torchscript":
+        path = cfg.get("torchscript_path", "disease_model/model.ts")
+        return TorchBackend(kind, _load_script(path, lambda: trace_frozen(FusedNet(load_net()))))
+
+    if kind == "int8_linear":
+        path = cfg.get("int8_path", "disease_model/model.int8.ts")
+        return TorchBackend(kind, _load_script(path, lambda: quantize_int8(FusedNet(load_net()))))
+
+    if kind == "onnx":
+        return OnnxBackend(cfg.get("onnx_path", "disease_model/model.onnx"), threads)
+
+    raise ValueError(f"Unknown inference_backend '{kind}', expected one of {BACKENDS}")
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# MICRO-BATCHER
+# ============================================================
+class MicroBatcher:
+    """
+    Collect concurrent requests into batches.
+
+    Callers await `submit(item)`. A single worker task takes the first
+    queued item, then keeps collecting until `max_batch` items are
+    gathered or `max_wait_ms` has passed, and hands the whole list to
+    `handler`. `handler(items)` is an async callable that must return one
+    result per item, in the same order.
+
+    Up to `concurrency` batches are in flight at once (e.g. one per
+    inference worker process); collection continues meanwhile.
+    """
+
+    def __init__(self, handler, max_batch: int = 8, max_wait_ms: float = 10, max_queue: int = 256,
+                 concurrency: int = 1):
+        self.handler = handler
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.max_queue = max(1, int(max_queue))
+        self.concurrency = max(1, int(concurrency))
+
+        self._queue = None
+        self._worker = None
+        self._slots = None
+        self._inflight = set()
+
+    def _ensure_worker(self):
+        """Start the worker lazily inside the running event loop."""
+        if self._worker is None or self._worker.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue(maxsize=self.max_queue)
+                self._slots = asyncio.Semaphore(self.concurrency)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item):
+        """Queue one item and wait for its own result."""
+        self._ensure_worker()
+        fut = asyncio.get_running_loop().create_future()
+        # Blocks (backpressure) when the queue is full
+        await self._queue.put((item, fut))
+        return await fut
+
+    async def _collect(self):
+        first = await self._queue.get()
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            # Wait for a free slot first, so a batch keeps filling
+            # while every slot is busy
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+
+            # Callers that gave up (cancelled) do not need a slot in the batch
+            batch = [(item, fut) for item, fut in batch if not fut.done()]
+            if not batch:
+                self._slots.release()
+                continue
+
+            task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: list):
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            logger.exception("Batch of %d failed", len(batch))
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        for (_, fut), res in zip(batch, results):
+            if not fut.done():
+                fut.set_result(res)
@@ -0,0 +1,197 @@
+import asyncio
+import atexit
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import CFG
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# CACHE KEYS
+# ============================================================
+def file_key(file_unique_id: str, crop: str, lang: str) -> str:
+    """Key for a Telegram file (same photo forwarded again)."""
+    return f"fid:{file_unique_id}:{crop}:{lang}"
+
+
+def content_key(img_bytes, crop: str, lang: str) -> str:
+    """Key for the image content itself (same photo re-uploaded)."""
+    digest = hashlib.sha256(img_bytes).hexdigest()
+    return f"sha:{digest}:{crop}:{lang}"
+
+
+# ============================================================
+# DIAGNOSIS CACHE (memory LRU + optional SQLite tier)
+# ============================================================
+class DiagnosisCache:
+    """
+    Size-bounded LRU of finished diagnosis texts with TTL eviction.
+    If `db_path` is set, entries are also kept in SQLite and survive
+    restarts; memory misses fall through to disk.
+
+    put() only touches memory; a background thread writes new entries
+    to SQLite in one transaction every `flush_interval` seconds.
+    Handlers use `await lookup(...)`, which reads the disk off the loop.
+    """
+
+    PURGE_EVERY = 200  # flushed rows between expired-row cleanups on disk
+
+    def __init__(self, max_size: int = 1000, ttl: float = 7 * 86400, db_path: str = None,
+                 flush_interval: float = 1.0):
+        self.max_size = max(1, int(max_size))
+        self.ttl = float(ttl)
+        self.flush_interval = float(flush_interval)
+
+        self._lock = threading.Lock()       # memory state
+        self._db_lock = threading.Lock()    # the SQLite connection
+        self._mem = OrderedDict()  # key -> (created, value)
+        self._pending = {}         # key -> (created, value) waiting for flush
+        self._writes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS diagnoses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+
+            threading.Thread(target=self._flush_loop, name="diagnosis-flush", daemon=True).start()
+            atexit.register(self.flush)
+
+    def _expired(self, created: float) -> bool:
+        return time.time() - created > self.ttl
+
+    def _remember(self, key: str, created: float, value: str):
+        self._mem[key] = (created, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_size:
+            self._mem.popitem(last=False)
+
+    # ----------------------------
+    # Reads
+    # ----------------------------
+    def _from_memory(self, key: str):
+        with self._lock:
+            entry = self._mem.get(key) or self._pending.get(key)
+            if entry is not None:
+                created, value = entry
+                if not self._expired(created):
+                    self._remember(key, created, value)
+                    return value
+                self._mem.pop(key, None)
+        return None
+
+    def _from_disk(self, keys: tuple):
+        """First key (in order) with a live row on disk: (key, created, value) or None."""
+        marks = ",".join("?" * len(keys))
+        with self._db_lock:
+            rows = self._db.execute(
+                f"SELECT key, value, created FROM diagnoses WHERE key IN ({marks})", keys
+            ).fetchall()
+        found = {key: (created, value) for key, value, created in rows if not self._expired(created)}
+        for key in keys:
+            if key in found:
+                return (key, *found[key])
+        return None
+
+    def _count(self, value, disk: bool = False, count_miss: bool = True):
+        if value is not None:
+            self.hits += 1
+            self.disk_hits += disk
+        elif count_miss:
+            self.misses += 1
+        return value
+
+    def get(self, *keys: str, count_miss: bool = True):
+        """Cached text for the first matching key, or None (sync; may read the disk)."""
+        for key in keys:
+            value = self._from_memory(key)
+            if value is not None:
+                return self._count(value)
+
+        row = self._from_disk(keys) if self._db is not None else None
+        if row is None:
+            return self._count(None, count_miss=count_miss)
+        key, created, value = row
+        with self._lock:
+            self._remember(key, created, value)
+        return self._count(value, disk=True)
+
+    async def lookup(self, *keys: str, count_miss: bool = True):
+        """Async get(): memory hits inline, the disk is read in a thread."""
+        for key in keys:
+            value = self._from_memory(key)
+            if value is not None:
+                return self._count(value)
+        if self._db is None:
+            return self._count(None, count_miss=count_miss)
+        return await asyncio.to_thread(self.get, *keys, count_miss=count_miss)
+
+    # ----------------------------
+    # Writes (write-behind)
+    # ----------------------------
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._db is not None:
+                self._pending[key] = (now, value)
+
+    def flush(self):
+        """Write pending entries to SQLite in one transaction."""
+        with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO diagnoses (key, value, created) VALUES (?, ?, ?)",
+                [(key, value, created) for key, (created, value) in batch.items()]
+            )
+            before = self._writes
+            self._writes += len(batch)
+            if self._writes // self.PURGE_EVERY != before // self.PURGE_EVERY:
+                self._db.execute("DELETE FROM diagnoses WHERE created < ?", (time.time() - self.ttl,))
+            self._db.commit()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Diagnosis cache flush failed: %s", e)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "size": len(self._mem),
+        }
+
+
+DIAGNOSIS_CACHE = DiagnosisCache(
+    max_size=CFG.get("diagnosis_cache_size", 1000),
+    ttl=CFG.get("diagnosis_cache_ttl", 7 * 86400),
+    db_path=CFG.get("diagnosis_cache_db"),
+)
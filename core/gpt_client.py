@@ -1,20 +1,7 @@
-import os
-import json
-import base64
-from openai import AsyncOpenAI
-
-# ============================================================
-# Load API Key
-# ============================================================
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "config.json")
-with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-    config = json.load(f)
-
-OPENAI_KEY = config.get("openai_api_key")
-if not OPENAI_KEY:
-    raise Exception("openai_api_key missing in config.json")
-
-client = AsyncOpenAI(api_key=OPENAI_KEY)
+# Shared pooled client with limits and retries
+from core.llm_gateway import chat, chat_stream
+# Token-budgeted image payloads (detail low for gates, high for diagnosis)
+from core.vision import image_part
 
 
 # ============================================================
@@ -38,7 +25,8 @@ FIELD = {
         "symptoms": "Belgilar",
         "treatment": "Davolash",
         "prevention": "Oldini olish",
-        "causes": "Sabablar"
+        "causes": "Sabablar",
+        "plain": "Xalq tilida"
     },
     "uzc": {
         "disease": "Касаллик",
@@ -47,7 +35,8 @@ FIELD = {
         "symptoms": "Белгилар",
         "treatment": "Даволаш",
         "prevention": "Олдини олиш",
-        "causes": "Сабаблар"
+        "causes": "Сабаблар",
+        "plain": "Халқ тилида"
     },
     "ru": {
         "disease": "Болезнь",
@@ -56,7 +45,8 @@ FIELD = {
         "symptoms": "Симптомы",
         "treatment": "Лечение",
         "prevention": "Профилактика",
-        "causes": "Причины"
+        "causes": "Причины",
+        "plain": "Простыми словами"
     },
     "en": {
         "disease": "Disease",
@@ -65,18 +55,12 @@ FIELD = {
         "symptoms": "Symptoms",
         "treatment": "Treatment",
         "prevention": "Prevention",
-        "causes": "Causes"
+        "causes": "Causes",
+        "plain": "In plain words"
     }
 }
 
 
-# ============================================================
-# Helper: Encode Image
-# ============================================================
-def encode_image(img_bytes: bytes) -> str:
-    return base64.b64encode(img_bytes).decode("utf-8")
-
-
 # ============================================================
 # 0. Topic Guard
 # ============================================================
@@ -96,7 +80,7 @@ async def topic_guard(question: str) -> bool:
     Question: {question}
     """
 
-    response = await client.chat.completions.create(
+    response = await chat(
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}]
     )
@@ -116,7 +100,7 @@ async def gpt_clean_text(text: str, lang: str = "en"):
         "Keep it short. Keep agricultural context. No disclaimers."
     )
 
-    response = await client.chat.completions.create(
+    response = await chat(
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": system_prompt},
@@ -127,6 +111,61 @@ async def gpt_clean_text(text: str, lang: str = "en"):
     return response.choices[0].message.content.strip()
 
 
+# ============================================================
+# 1b. Topic Guard + Answer in ONE streamed call
+# ============================================================
+OFFTOPIC = "__OFFTOPIC__"
+
+
+async def gpt_answer_stream(text: str, lang: str = "en"):
+    """
+    Yield answer pieces as they arrive.
+    If the question is not about agriculture, yield OFFTOPIC once and stop.
+    """
+    target_lang = LANG_MAP.get(lang, "English")
+
+    system_prompt = (
+        "First decide if the user's message is related to AGRICULTURE "
+        "(crops, plants, soil, irrigation, diseases, pests, fertilizers, "
+        "pesticides, weather for farming, farming techniques). "
+        f"If it is NOT, reply with exactly {OFFTOPIC} and nothing else. "
+        f"Otherwise rewrite the user's text cleanly and clearly in {target_lang}. "
+        "Keep it short. Keep agricultural context. No disclaimers."
+    )
+
+    stream = chat_stream(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text}
+        ]
+    )
+
+    # Hold back the first characters until we know it is not the sentinel
+    head = ""
+    async for piece in stream:
+        if head is None:
+            yield piece
+            continue
+
+        head += piece
+        start = head.lstrip()
+        if start.startswith(OFFTOPIC):
+            await stream.aclose()
+            yield OFFTOPIC
+            return
+        if not start or OFFTOPIC.startswith(start):
+            continue  # may still turn into the sentinel
+
+        yield start
+        head = None
+
+    # Only the full sentinel means off-topic; a short answer that merely
+    # looks like its start (e.g. "__") is still an answer
+    if head is not None and head.strip():
+        yield head.strip()
+
+
 # ============================================================
 # 2. Text Disease Explanation
 # ============================================================
@@ -135,7 +174,7 @@ async def gpt_detect_disease(text: str, lang: str = "en"):
 
     system_prompt = f"You are a crop disease expert. Respond briefly in {target_lang}."
 
-    resp = await client.chat.completions.create(
+    resp = await chat(
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": system_prompt},
@@ -152,7 +191,7 @@ async def gpt_detect_disease(text: str, lang: str = "en"):
 async def gpt_predict_disease(image_bytes: bytes, crop_type: str, lang: str):
     target_lang = LANG_MAP.get(lang, "English")
     F = FIELD[lang]  # multilingual labels
-    img_b64 = encode_image(image_bytes)
+    image = await image_part(image_bytes, "high", model="gpt-4o")
 
     system_prompt = f"""
     You are an agricultural plant disease expert.
@@ -185,17 +224,14 @@ async def gpt_predict_disease(image_bytes: bytes, crop_type: str, lang: str):
     - prevention 2
     """
 
-    response = await client.chat.completions.create(
+    response = await chat(
         model="gpt-4o",
         messages=[
             {"role": "system", "content": system_prompt},
             {
                 "role": "user",
                 "content": [
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}
-                    },
+                    image,
                     {"type": "text", "text": f"Crop type: {crop_type}"}
                 ]
             }
@@ -209,15 +245,15 @@ async def gpt_predict_disease(image_bytes: bytes, crop_type: str, lang: str):
 # 4. YES / NO Image Detector
 # ============================================================
 async def gpt_yes_no(question: str, img_bytes: bytes):
-    img_b64 = encode_image(img_bytes)
+    image = await image_part(img_bytes, "low", model="gpt-4o-mini")
 
-    resp = await client.chat.completions.create(
+    resp = await chat(
         model="gpt-4o-mini",
         messages=[
             {
                 "role": "user",
                 "content": [
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}},
+                    image,
                     {"type": "text", "text": question}
                 ]
             }
@@ -249,7 +285,7 @@ async def gpt_crop_match(user_crop: str, model_classes: list[str]):
     - If no match → return NONE
     """
 
-    resp = await client.chat.completions.create(
+    resp = await chat(
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": system_prompt},
@@ -312,7 +348,7 @@ async def gpt_enrich_local_model(disease_name: str, crop: str, confidence: float
     - ...
     """
 
-    response = await client.chat.completions.create(
+    response = await chat(
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": system_prompt},
@@ -1,12 +1,9 @@
 # core/gpt_disease.py
-import base64
-from openai import OpenAI
-from config import CFG
-
-client = OpenAI(api_key=CFG["openai_api_key"])
+from core.llm_gateway import chat
+from core.vision import image_part
 
 async def gpt_detect_disease(plant, img_bytes):
-    b64 = base64.b64encode(img_bytes).decode()
+    image = await image_part(img_bytes, "high", model="gpt-4.1")
 
     prompt = f"""
 You are an agronomist. Detect the disease of this plant: {plant}.
@@ -14,14 +11,14 @@ Return compact structured info: diagnosis, cause, treatment, prevention.
 No extra text.
 """
 
-    rsp = client.chat.completions.create(
+    rsp = await chat(
         model="gpt-4.1",
         messages=[
             {
                 "role": "user",
                 "content": [
                     {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64}"}}
+                    image
                 ]
             }
         ],
@@ -1,8 +1,5 @@
 # core/grammar_fix.py
-from openai import OpenAI
-from config import CFG
-
-client = OpenAI(api_key=CFG["openai_api_key"])
+from core.llm_gateway import chat
 
 async def grammar_fix(text, lang_code):
     prompt = f"""
@@ -12,7 +9,7 @@ Text:
 {text}
 """
 
-    rsp = client.chat.completions.create(
+    rsp = await chat(
         model="gpt-4.1",
         messages=[{"role": "user", "content": prompt}],
         max_tokens=200
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# PROCESS POOL FOR CPU-HEAVY WORK
+# ============================================================
+class InferencePool:
+    """
+    Run CPU-heavy functions in worker processes and await the result.
+
+    Each worker runs `initializer(*initargs)` once at startup (e.g. load
+    the model). If a worker dies, the pool is rebuilt and the call is
+    retried once.
+    """
+
+    def __init__(self, workers: int = 1, initializer=None, initargs=()):
+        self.workers = max(1, int(workers))
+        self.initializer = initializer
+        self.initargs = initargs
+
+        self._executor = None
+        self._lock = asyncio.Lock()
+
+    def _new_executor(self):
+        # "spawn" avoids forking a process that already holds torch threads
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.initializer,
+            initargs=self.initargs,
+        )
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = self._new_executor()
+        return self._executor
+
+    async def _restart(self, broken):
+        async with self._lock:
+            # Another caller may have already replaced it
+            if self._executor is broken:
+                logger.warning("Inference worker crashed, restarting pool")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                return await loop.run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                await self._restart(executor)
+                if attempt:
+                    raise
+
+    def shutdown(self, wait: bool = False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
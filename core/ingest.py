@@ -0,0 +1,62 @@
+import io
+
+from config import CFG
+
+# The model needs 224 px; vision calls are sized in core/vision.py.
+# Telegram usually offers 90 / 320 / 800 / 1280 px versions of a photo.
+MODEL_SIDE = 224
+PHOTO_MIN_SIDE = CFG.get("photo_min_side", 512)
+
+
+# ============================================================
+# PHOTO SIZE SELECTION
+# ============================================================
+def pick_photo_size(sizes: list, min_side: int = PHOTO_MIN_SIDE):
+    """Smallest Telegram PhotoSize whose short side is >= min_side (else the largest)."""
+    by_area = sorted(sizes, key=lambda s: s.width * s.height)
+    for size in by_area:
+        if min(size.width, size.height) >= min_side:
+            return size
+    return by_area[-1]
+
+
+# ============================================================
+# DECODING (PIL is imported lazily)
+# ============================================================
+def open_reduced(data, min_size: tuple):
+    """
+    Open an image as RGB, letting the JPEG decoder scale down by 1/2, 1/4
+    or 1/8 while decoding (PIL draft mode) as long as the result stays
+    >= min_size. Non-JPEG images decode at full size.
+    """
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    img.draft("RGB", min_size)
+    return img.convert("RGB")
+
+
+# ============================================================
+# INGESTED PHOTO
+# ============================================================
+class Photo:
+    """
+    One downloaded photo, shared by every stage of the pipeline.
+
+    `data` is a memoryview over the download buffer, so hashing,
+    decoding and vision encoding all work on it without copies.
+    """
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+
+    @property
+    def size(self) -> int:
+        return self.data.nbytes
+
+
+async def download_photo(bot, photo_size) -> Photo:
+    """Download a PhotoSize into memory without an extra copy."""
+    file = await bot.get_file(photo_size.file_id)
+    buf = await bot.download_file(file.file_path)
+    return Photo(buf.getbuffer())
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from config import CFG
+from core.gpt_client import LANG_MAP, FIELD
+from core.llm_gateway import chat
+
+logger = logging.getLogger(__name__)
+
+# Bump when the entry layout changes; older files are ignored
+KB_VERSION = 1
+
+KNOWLEDGE_PATH = CFG.get("knowledge_path", "disease_model/knowledge.json")
+LANGUAGES = CFG.get("languages", list(LANG_MAP))
+
+
+# ============================================================
+# LOAD / SAVE
+# ============================================================
+def _empty() -> dict:
+    return {"version": KB_VERSION, "built": None, "entries": {}}
+
+
+def load_knowledge(path: str = KNOWLEDGE_PATH) -> dict:
+    """Return the knowledge base, or an empty one if missing/outdated."""
+    if not os.path.exists(path):
+        return _empty()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return _empty()
+    if data.get("version") != KB_VERSION:
+        return _empty()
+    return data
+
+
+def save_knowledge(data: dict, path: str = KNOWLEDGE_PATH):
+    """Atomic write: readers never see a half-written file."""
+    data["built"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+KNOWLEDGE = load_knowledge()
+
+
+# ============================================================
+# RENDER (zero LLM calls)
+# ============================================================
+def _bullets(items) -> str:
+    return "\n".join(f"- {x}" for x in items)
+
+
+def render_local_diagnosis(raw_label: str, crop: str, confidence: float, lang: str):
+    """
+    Build the answer for a local-model label from the knowledge base.
+    Return None if the (label, lang) entry is missing.
+    """
+    entry = KNOWLEDGE["entries"].get(raw_label, {}).get(lang)
+    if not entry:
+        return None
+
+    F = FIELD.get(lang, FIELD["en"])
+
+    return (
+        f"🌿 {F['disease']}: {entry['disease']}\n"
+        f"🗣 {F['plain']}: {entry['plain']}\n\n"
+        f"🌱 {F['crop']}: {entry.get('crop') or crop}\n"
+        f"📊 {F['confidence']}: {confidence}%\n\n"
+        f"🔍 {F['symptoms']}:\n{_bullets(entry['symptoms'])}\n\n"
+        f"💊 {F['treatment']}:\n{_bullets(entry['treatment'])}\n\n"
+        f"🛡 {F['prevention']}:\n{_bullets(entry['prevention'])}"
+    )
+
+
+# ============================================================
+# BUILD / REFRESH (offline or in background)
+# ============================================================
+async def generate_entry(raw_label: str, lang: str) -> dict:
+    target = LANG_MAP.get(lang, "English")
+    crop, _, disease = raw_label.partition("___")
+
+    prompt = f"""
+    Plant disease label from a PlantVillage model: {raw_label}
+    Crop: {crop.replace("_", " ")}
+    Disease: {disease.replace("_", " ")}
+
+    Write everything in {target}. Return ONLY a JSON object:
+    {{
+      "disease": "<disease name>",
+      "crop": "<crop name>",
+      "plain": "<1-2 simple sentences for a farmer>",
+      "symptoms": ["...", "...", "..."],
+      "treatment": ["...", "...", "..."],
+      "prevention": ["...", "..."]
+    }}
+    For a healthy label, say the plant looks healthy and give care tips.
+    """
+
+    resp = await chat(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": "You are a crop disease expert. No disclaimers."},
+            {"role": "user", "content": prompt}
+        ],
+        response_format={"type": "json_object"}
+    )
+
+    entry = json.loads(resp.choices[0].message.content)
+    for key in ("disease", "plain", "symptoms", "treatment", "prevention"):
+        if key not in entry:
+            raise ValueError(f"{raw_label}/{lang}: missing '{key}'")
+    entry["updated"] = time.time()
+    return entry
+
+
+async def build_knowledge(labels, langs=None, max_age: float = None, force: bool = False, path: str = KNOWLEDGE_PATH):
+    """
+    Fill missing (label, lang) entries; also regenerate entries older than
+    `max_age` seconds, or all of them with `force`. Saves after each label
+    so an interrupted build keeps its progress. File I/O runs in a
+    thread, so the refresh loop never blocks the bot's event loop.
+    """
+    data = await asyncio.to_thread(load_knowledge, path)
+    langs = langs or LANGUAGES
+    now = time.time()
+
+    for label in labels:
+        per_lang = data["entries"].setdefault(label, {})
+        todo = [
+            lang for lang in langs
+            if force
+            or lang not in per_lang
+            or (max_age is not None and now - per_lang[lang].get("updated", 0) > max_age)
+        ]
+        if not todo:
+            continue
+
+        results = await asyncio.gather(
+            *(generate_entry(label, lang) for lang in todo), return_exceptions=True
+        )
+        for lang, res in zip(todo, results):
+            if isinstance(res, Exception):
+                logger.warning("Knowledge entry %s/%s failed: %s", label, lang, res)
+            else:
+                per_lang[lang] = res
+
+        await asyncio.to_thread(save_knowledge, data, path)
+        logger.info("Knowledge: %s (%s)", label, ", ".join(todo))
+
+    return data
+
+
+async def refresh_loop(labels, every_hours: float, max_age_days: float):
+    """Background task: periodically refresh stale entries and reload."""
+    global KNOWLEDGE
+    while True:
+        try:
+            KNOWLEDGE = await build_knowledge(labels, max_age=max_age_days * 86400)
+        except Exception as e:
+            logger.warning("Knowledge refresh failed: %s", e)
+        await asyncio.sleep(every_hours * 3600)
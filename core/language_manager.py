@@ -1,6 +1,9 @@
 import json
 import os
 
+# User language lives in the shared profile store (core/user_store.py)
+from core.user_manager import get_user_lang, set_user_lang
+
 # Path to translations.json
 LANG_PATH = os.path.join(os.path.dirname(__file__), "translations.json")
 
@@ -9,47 +12,6 @@ with open(LANG_PATH, "r", encoding="utf-8") as f:
     TRANSLATIONS = json.load(f)
 
 
-# ============================================================
-# USER LANGUAGE MANAGEMENT
-# ============================================================
-
-def _user_file(user_id: str):
-    return f"users/{user_id}/user.json"
-
-
-def get_user_lang(user_id: str) -> str:
-    """Returns user's language or English as default."""
-    file = _user_file(user_id)
-
-    if not os.path.exists(file):
-        return "en"
-
-    try:
-        with open(file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data.get("lang", "en")
-    except:
-        return "en"
-
-
-def set_user_lang(user_id: str, lang: str):
-    """Saves user's selected language."""
-    os.makedirs(f"users/{user_id}", exist_ok=True)
-    file = _user_file(user_id)
-
-    data = {}
-    if os.path.exists(file):
-        try:
-            data = json.load(open(file, "r", encoding="utf-8"))
-        except:
-            data = {}
-
-    data["lang"] = lang
-
-    with open(file, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-
-
 # ============================================================
 # TRANSLATION HANDLING
 # ============================================================
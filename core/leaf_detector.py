@@ -1,9 +1,26 @@
+from config import CFG
 from core.gpt_client import gpt_yes_no
 
-async def is_leaf_image(img_bytes):
-    prompt = (
-        "Determine if this image contains a plant, leaf, crop, or tree. "
-        "Answer only: YES or NO."
-    )
-    ans = await gpt_yes_no(prompt, img_bytes)
+DEFAULT_PROMPT = (
+    "Determine if this image contains a plant, leaf, crop, or tree. "
+    "Answer only: YES or NO."
+)
+
+# Local scores inside this band are "unsure" and go to GPT
+UNCERTAIN_LOW, UNCERTAIN_HIGH = CFG.get("leaf_uncertain_band", [0.2, 0.8])
+
+
+def local_leaf_verdict(prob):
+    """True / False from the local score, None when GPT must decide."""
+    if prob is None:
+        return None
+    if prob >= UNCERTAIN_HIGH:
+        return True
+    if prob <= UNCERTAIN_LOW:
+        return False
+    return None
+
+
+async def gpt_leaf_check(img_bytes, prompt: str = None) -> bool:
+    ans = await gpt_yes_no(prompt or DEFAULT_PROMPT, img_bytes)
     return ans == "YES"
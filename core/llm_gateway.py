@@ -0,0 +1,166 @@
+import asyncio
+import contextlib
+import logging
+import random
+
+import httpx
+
+from config import CFG
+from core.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# LLM GATEWAY
+# ============================================================
+class LLMGateway:
+    """
+    One shared AsyncOpenAI client for the whole bot.
+
+    - pooled keep-alive HTTP connections
+    - global and per-model concurrency limits
+    - token-bucket rate limit
+    - retries with exponential backoff + jitter on 429 / 5xx / network errors
+    - per-call timeout
+    """
+
+    def __init__(self, cfg: dict):
+        self.api_key = cfg.get("openai_api_key")
+        self.timeout = float(cfg.get("llm_timeout", 60))
+        self.max_retries = int(cfg.get("llm_max_retries", 3))
+        self.max_connections = int(cfg.get("llm_max_connections", 20))
+
+        self._global = asyncio.Semaphore(int(cfg.get("llm_max_concurrency", 16)))
+        self._model_limits = dict(cfg.get("llm_model_concurrency", {}))
+        self._models = {}
+        self._bucket = TokenBucket(cfg.get("llm_rate_per_sec", 10), cfg.get("llm_burst", 20))
+
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            # The SDK is imported on first use; it adds ~0.5 s to startup
+            from openai import AsyncOpenAI
+
+            if not self.api_key:
+                raise Exception("openai_api_key missing in config.json")
+
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60,
+                ),
+                timeout=self.timeout,
+            )
+            # Retries are handled here, not inside the SDK
+            self._client = AsyncOpenAI(api_key=self.api_key, http_client=http_client, max_retries=0)
+        return self._client
+
+    def _model_sem(self, model: str):
+        sem = self._models.get(model)
+        if sem is None and model in self._model_limits:
+            sem = self._models[model] = asyncio.Semaphore(int(self._model_limits[model]))
+        return sem
+
+    @staticmethod
+    def _retry_delay(err, attempt: int) -> float:
+        response = getattr(err, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        # Full jitter: 0 .. 0.5 * 2^attempt seconds, capped
+        return random.uniform(0, min(20.0, 0.5 * 2 ** attempt))
+
+    @staticmethod
+    def _retryable(err) -> bool:
+        from openai import APIConnectionError, APIStatusError, RateLimitError
+
+        if isinstance(err, (RateLimitError, APIConnectionError)):
+            return True
+        return isinstance(err, APIStatusError) and err.status_code >= 500
+
+    async def _call(self, model: str, fn):
+        sem = self._model_sem(model)
+        attempt = 0
+
+        while True:
+            await self._bucket.acquire()
+            try:
+                async with self._global:
+                    if sem is None:
+                        return await fn()
+                    async with sem:
+                        return await fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not self._retryable(e):
+                    raise
+                delay = self._retry_delay(e, attempt)
+                logger.warning("LLM call to %s failed (%s), retry in %.1fs", model, e, delay)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def chat(self, model: str, messages: list, timeout: float = None, **kwargs):
+        """chat.completions.create with pooling, limits and retries."""
+        return await self._call(
+            model,
+            lambda: self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=timeout or self.timeout,
+                **kwargs
+            )
+        )
+
+    async def chat_stream(self, model: str, messages: list, timeout: float = None, **kwargs):
+        """
+        Streaming chat completion; yields content deltas.
+        Retries only happen before the first delta was produced.
+        """
+        sem = self._model_sem(model)
+        attempt = 0
+
+        while True:
+            await self._bucket.acquire()
+            started = False
+            try:
+                async with self._global, (sem or contextlib.nullcontext()):
+                    stream = await self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        stream=True,
+                        timeout=timeout or self.timeout,
+                        **kwargs
+                    )
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            started = True
+                            yield delta
+                return
+            except Exception as e:
+                if started or attempt >= self.max_retries or not self._retryable(e):
+                    raise
+                delay = self._retry_delay(e, attempt)
+                logger.warning("LLM stream to %s failed (%s), retry in %.1fs", model, e, delay)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+
+GATEWAY = LLMGateway(CFG)
+
+
+async def chat(model: str, messages: list, timeout: float = None, **kwargs):
+    return await GATEWAY.chat(model, messages, timeout=timeout, **kwargs)
+
+
+def chat_stream(model: str, messages: list, timeout: float = None, **kwargs):
+    return GATEWAY.chat_stream(model, messages, timeout=timeout, **kwargs)
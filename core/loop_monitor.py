@@ -0,0 +1,55 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# EVENT LOOP LAG MONITOR
+# ============================================================
+class LoopLagMonitor:
+    """
+    Sleep `interval` seconds in a loop and measure how late the loop
+    wakes us up. Anything blocking the event loop (sync disk I/O, CPU
+    work, sync HTTP) shows up directly as lag.
+    """
+
+    def __init__(self, interval: float = 0.5, warn_ms: float = 100, window: int = 1200):
+        self.interval = float(interval)
+        self.warn_ms = float(warn_ms)
+        self.samples = deque(maxlen=window)  # lag in ms
+        self.max_ms = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, (time.perf_counter() - start - self.interval) * 1000)
+
+            self.samples.append(lag)
+            self.max_ms = max(self.max_ms, lag)
+            if lag >= self.warn_ms:
+                logger.warning("Event loop blocked for %.0f ms", lag)
+
+    def stats(self) -> dict:
+        if not self.samples:
+            return {"p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0, "samples": 0}
+
+        ordered = sorted(self.samples)
+
+        def pct(p):
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1)
+
+        return {
+            "p50_ms": pct(0.50),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max_ms, 1),
+            "samples": len(ordered),
+        }
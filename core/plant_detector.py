@@ -1,8 +1,5 @@
 # core/plant_detector.py
-from openai import OpenAI
-from config import CFG
-
-client = OpenAI(api_key=CFG["openai_api_key"])
+from core.llm_gateway import chat
 
 async def detect_plant_name(text):
     prompt = f"""
@@ -12,7 +9,7 @@ Return only ONE word (example: apple, potato, tomato, wheat, cotton).
 If not found, return NONE.
 """
 
-    rsp = client.chat.completions.create(
+    rsp = await chat(
         model="gpt-4.1",
         messages=[{"role": "user", "content": prompt}],
         max_tokens=10
@@ -1,88 +1,349 @@
-import torch
-import timm
-from PIL import Image
-from torchvision import transforms as T
-import io, json, os
+import asyncio
+import json, os
+import logging
+
+# torch / timm / torchvision / PIL are imported inside the functions
+# that run in inference workers, so importing this module is cheap
+from core.batcher import MicroBatcher
+from core.ingest import open_reduced, MODEL_SIDE
+from core.inference_pool import InferencePool
+
+logger = logging.getLogger(__name__)
 
 # Load config
 with open("config.json", "r", encoding="utf-8") as f:
     CFG = json.load(f)
 
 MODEL_PATH = CFG["model_path"]
+LEAF_HEAD_PATH = CFG.get("leaf_head_path", "disease_model/leaf_head.pth")
+
+# eager | torchscript | int8 | onnx (see core/backends.py, export_model.py)
+BACKEND = CFG.get("inference_backend", "eager")
+
+LABELS_PATH = CFG.get("labels_path", "disease_model/labels.json")
+
 
 # ----------------------------------------
-# Crops supported by the trained model
+# Label space: labels.json maps "Crop___Disease" -> output index
 # ----------------------------------------
-MODEL_CLASSES = ["apple", "potato", "tomato"]
+def load_labels(path: str = LABELS_PATH) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        mapping = json.load(f)
+
+    classes = sorted(mapping, key=mapping.get)
+    if [mapping[c] for c in classes] != list(range(len(classes))):
+        raise ValueError(f"{path}: indices must be 0..{len(classes) - 1} without gaps")
+    return classes
+
+
+def crop_key(label_crop: str) -> str:
+    """'Corn_(maize)' -> 'corn', 'Pepper,_bell' -> 'pepper', 'Tomato' -> 'tomato'."""
+    return label_crop.split("(")[0].split(",")[0].strip("_ ").replace("_", " ").lower()
+
+
+# All disease labels, in the model's output order
+CLASSES = load_labels()
+
+# Crops supported by the trained model, and their class indices
+CROP_CLASSES = {}
+for _i, _label in enumerate(CLASSES):
+    CROP_CLASSES.setdefault(crop_key(_label.split("___")[0]), []).append(_i)
+
+MODEL_CLASSES = sorted(CROP_CLASSES)
 
 # ----------------------------------------
-# All disease labels inside your model
+# Load model (once per inference worker)
 # ----------------------------------------
-CLASSES = [
-    'Apple___Apple_scab','Apple___Black_rot','Apple___Cedar_apple_rust','Apple___healthy',
-    'Potato___Early_blight','Potato___Late_blight','Potato___healthy',
-    'Tomato___Bacterial_spot','Tomato___Early_blight','Tomato___Late_blight',
-    'Tomato___Leaf_Mold','Tomato___Septoria_leaf_spot',
-    'Tomato___Spider_mites Two-spotted_spider_mite','Tomato___Target_Spot',
-    'Tomato___Tomato_Yellow_Leaf_Curl_Virus','Tomato___Tomato_mosaic_virus','Tomato___healthy'
-]
+model = None
+
+
+class ModelLoadError(RuntimeError):
+    """The local model cannot be loaded (missing file, label mismatch, ...)."""
+
+
+def load_model():
+    global model
+    if model is None:
+        import timm
+        import torch
+
+        state = torch.load(MODEL_PATH, map_location="cpu")
+        head = state.get("classifier.weight")
+        if head is not None and head.shape[0] != len(CLASSES):
+            raise ModelLoadError(
+                f"{MODEL_PATH} has {head.shape[0]} outputs but {LABELS_PATH} has {len(CLASSES)} labels; "
+                "retrain on labels.json or point labels_path at a matching file "
+                "(disease_model/labels_17.json for the old 17-class model)"
+            )
+
+        net = timm.create_model("efficientnet_b3", pretrained=False, num_classes=len(CLASSES))
+        net.load_state_dict(state, strict=True)
+        net.eval()
+        model = net
+    return model
+
+
+backend = None
+
+
+def load_backend(threads: int = 1):
+    """The configured inference backend: x -> (embedding, logits)."""
+    global backend
+    if backend is None:
+        from core.backends import create_backend
+
+        backend = create_backend(BACKEND, load_model, CFG, threads)
+    return backend
+
 
 # ----------------------------------------
-# Load model
+# Leaf / plant presence head (optional)
+# Linear layer on the backbone's pooled features,
+# trained with train_leaf_head.py
 # ----------------------------------------
-model = timm.create_model("efficientnet_b3", pretrained=False, num_classes=len(CLASSES))
-state = torch.load(MODEL_PATH, map_location="cpu")
-model.load_state_dict(state, strict=False)
-model.eval()
+leaf_head = None
+
+
+def has_leaf_head() -> bool:
+    """True if a trained leaf head is installed (workers will load it)."""
+    return os.path.exists(LEAF_HEAD_PATH)
+
+
+def load_leaf_head():
+    global leaf_head
+    if leaf_head is None and os.path.exists(LEAF_HEAD_PATH):
+        import torch
+
+        state = torch.load(LEAF_HEAD_PATH, map_location="cpu")
+        head = torch.nn.Linear(state["weight"].shape[1], 1)
+        head.load_state_dict(state)
+        head.eval()
+        leaf_head = head
+    return leaf_head
+
+
+_init_error = None
+
+
+def init_worker(threads: int):
+    """
+    Process pool initializer: pin torch threads and load the backend.
+    A load failure is kept (not raised, which would break the pool) and
+    reported by every call as ModelLoadError.
+    """
+    global _init_error
+    import torch
+
+    torch.set_num_threads(max(1, int(threads)))
+    torch.set_num_interop_threads(1)
+    try:
+        load_backend(threads)
+        load_leaf_head()
+    except Exception as e:
+        _init_error = f"{type(e).__name__}: {e}"
 
 # ----------------------------------------
 # Image preprocessing
 # ----------------------------------------
-transform = T.Compose([
-    T.Resize((224, 224)),
-    T.ToTensor(),
-    T.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-])
+transform = None
+
+
+def get_transform():
+    global transform
+    if transform is None:
+        from torchvision import transforms as T
+
+        transform = T.Compose([
+            T.Resize((MODEL_SIDE, MODEL_SIDE)),
+            T.ToTensor(),
+            T.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+        ])
+    return transform
 
 # ----------------------------------------
 # Helper to humanize label
 # ----------------------------------------
 def _parse_label(label: str):
-    # Example: "Tomato___Early_blight"
+    # Example: "Corn_(maize)___Common_rust_" -> ("corn", "Common Rust")
     parts = label.split("___")
-    crop = parts[0]
-    disease = parts[1].replace("_", " ")
+    crop = crop_key(parts[0])
+    disease = parts[1].replace("_", " ").strip()
 
     return crop, disease.title()
 
+
 # ----------------------------------------
-# Prediction function
+# Per-crop logit masks
+# Row r of the mask matrix is 0 on crop r's classes and -inf elsewhere;
+# the last row (no crop / unknown crop) is all zeros. Adding the rows
+# to the logits restricts softmax and top-1 to the declared crop.
 # ----------------------------------------
-async def predict_disease(img_bytes):
-    # Safe-loading image
+CROP_ROW = {crop: r for r, crop in enumerate(MODEL_CLASSES)}
+crop_masks = None
+
+
+def get_crop_masks():
+    global crop_masks
+    if crop_masks is None:
+        import torch
+
+        masks = torch.full((len(MODEL_CLASSES) + 1, len(CLASSES)), float("-inf"))
+        for crop, r in CROP_ROW.items():
+            masks[r, CROP_CLASSES[crop]] = 0.0
+        masks[-1] = 0.0
+        crop_masks = masks
+    return crop_masks
+
+# ----------------------------------------
+# Fused batched inference
+# One backbone pass feeds every head:
+#   leaf    - leaf/plant probability (None if no leaf head)
+#   ood     - out-of-distribution score: 1 - softmax over ALL classes
+#             of the chosen class (a wrong declared crop scores high)
+#   crop / disease / confidence / raw - disease head top-1, restricted
+#             to the declared crop's classes when it is a model crop
+# ----------------------------------------
+INVALID_RESULT = {
+    "leaf": None,
+    "ood": 1.0,
+    "crop": None,
+    "disease": None,
+    "confidence": 0,
+    "raw": "Invalid or unreadable image."
+}
+
+
+def _load_tensor(img_bytes):
+    """Decode (JPEG draft mode, ~224 px) and preprocess one image, or None if unreadable."""
     try:
-        img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
+        img = open_reduced(img_bytes, (MODEL_SIDE, MODEL_SIDE))
     except Exception:
-        return {
-            "crop": None,
-            "disease": None,
-            "confidence": 0,
-            "raw": "Invalid or unreadable image."
-        }
+        return None
+    return get_transform()(img)
+
+
+def analyze_batch(items: list) -> list[dict]:
+    """
+    items: (image bytes, crop or None) pairs.
+    Decode each image once and run ONE backbone pass over the batch.
+    Return one analysis dict per image, in the same order.
+    """
+    if _init_error:
+        raise ModelLoadError(_init_error)
+
+    tensors = [_load_tensor(b) for b, _ in items]
+    valid = [i for i, x in enumerate(tensors) if x is not None]
+    results = [dict(INVALID_RESULT) for _ in items]
+
+    if not valid:
+        return results
+
+    import torch
 
-    x = transform(img).unsqueeze(0)
+    x = torch.stack([tensors[i] for i in valid])
+    head = load_leaf_head()
 
+    emb, logits = load_backend()(x)
+    rows = torch.tensor([CROP_ROW.get(items[i][1], -1) for i in valid])
     with torch.no_grad():
-        y = model(x)
-        idx = torch.argmax(y).item()
-        conf = torch.softmax(y, dim=1)[0][idx].item()
-
-    raw_label = CLASSES[idx]
-    crop, disease_name = _parse_label(raw_label)
-
-    return {
-        "crop": crop.lower(),
-        "disease": disease_name,
-        "confidence": round(conf * 100, 2),
-        "raw": raw_label
-    }
+        full = torch.softmax(logits, dim=1)
+        probs = torch.softmax(logits + get_crop_masks()[rows], dim=1)
+        confs, idxs = probs.max(dim=1)
+        unmasked = full.gather(1, idxs.unsqueeze(1)).squeeze(1)
+        leaf = torch.sigmoid(head(emb)).squeeze(1) if head is not None else None
+
+    for row, i in enumerate(valid):
+        raw_label = CLASSES[idxs[row].item()]
+        crop, disease_name = _parse_label(raw_label)
+        conf = confs[row].item()
+
+        results[i] = {
+            "leaf": round(leaf[row].item(), 4) if leaf is not None else None,
+            "ood": round(1 - unmasked[row].item(), 4),
+            "crop": crop,
+            "disease": disease_name,
+            "confidence": round(conf * 100, 2),
+            "raw": raw_label
+        }
+
+    return results
+
+
+POOL = InferencePool(
+    workers=CFG.get("inference_workers", 1),
+    initializer=init_worker,
+    initargs=(CFG.get("inference_threads_per_worker", 2),),
+)
+
+
+async def _run_batch(items):
+    # Decoding, preprocessing and the forward pass all run in a worker process
+    return await POOL.run(analyze_batch, items)
+
+
+BATCHER = MicroBatcher(
+    _run_batch,
+    max_batch=CFG.get("inference_batch_size", 8),
+    max_wait_ms=CFG.get("inference_max_wait_ms", 10),
+    max_queue=CFG.get("inference_queue_size", 256),
+    concurrency=POOL.workers,
+)
+
+
+# ----------------------------------------
+# Warm-up / model check
+# With inference_warmup (default) run_bot starts the workers right away,
+# so a model that cannot load is reported at startup. Otherwise the
+# first photo finds out. Either way it is logged once and photos then
+# go to GPT only.
+# ----------------------------------------
+MODEL_ERROR = None
+
+
+def _ready():
+    return _init_error
+
+
+def local_model_available() -> bool:
+    return MODEL_ERROR is None
+
+
+def _disable_model(error: str):
+    global MODEL_ERROR
+    if MODEL_ERROR is None:
+        MODEL_ERROR = error
+        logger.error("Local disease model disabled, photos will use GPT vision only: %s", error)
+
+
+async def warm_up():
+    """Start every inference worker (each loads the model in its initializer)."""
+    errors = await asyncio.gather(*(POOL.run(_ready) for _ in range(POOL.workers)))
+    error = next((e for e in errors if e), None)
+    if error:
+        _disable_model(error)
+    else:
+        logger.info("Local disease model ready (%d classes, %s backend)", len(CLASSES), BACKEND)
+
+
+# ----------------------------------------
+# Prediction functions
+# ----------------------------------------
+async def analyze_image(img_bytes, crop: str = None) -> dict:
+    """
+    Full single-pass analysis: leaf, ood and disease top-1.
+    With a model crop (see MODEL_CLASSES), only its classes are scored.
+    """
+    if MODEL_ERROR:
+        raise ModelLoadError(MODEL_ERROR)
+    try:
+        # Workers need picklable bytes (bytes(b) is free when b already is bytes)
+        return await BATCHER.submit((bytes(img_bytes), crop))
+    except ModelLoadError as e:
+        _disable_model(str(e))
+        raise
+
+
+async def predict_disease(img_bytes, crop: str = None):
+    res = await analyze_image(img_bytes, crop)
+    return {k: res[k] for k in ("crop", "disease", "confidence", "raw")}
+
@@ -0,0 +1,30 @@
+import asyncio
+import time
+
+
+# ============================================================
+# TOKEN BUCKET (requests per second)
+# ============================================================
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = float(rate)
+        self.capacity = max(1, int(burst))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
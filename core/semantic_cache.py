@@ -0,0 +1,275 @@
+import atexit
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+
+from config import CFG
+from core.topic_guard import normalize, agro_terms
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# LOCAL EMBEDDING
+# Hashed character n-grams (3..5) of the normalized question,
+# signed feature hashing into DIM buckets, L2-normalized.
+# Robust to typos, word order and suffixes (uz/ru morphology);
+# crc32 keeps vectors stable across processes and restarts.
+# numpy is imported on first use.
+# ============================================================
+DIM = 2048
+NGRAMS = (3, 4, 5)
+
+
+def embed(text: str):
+    import numpy as np
+
+    vec = np.zeros(DIM, dtype=np.float32)
+    padded = f" {normalize(text)} "
+    for n in NGRAMS:
+        for i in range(len(padded) - n + 1):
+            h = zlib.crc32(padded[i:i + n].encode("utf-8"))
+            vec[h % DIM] += 1.0 if h & 0x80000000 else -1.0
+
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+# ============================================================
+# HIT GUARD
+# N-grams cannot tell "tomato" from "potato" or "water" from "not
+# water" reliably, so a hit also needs the same numbers, the same
+# crop/disease/pest terms (topic guard stems) and the same negations.
+# Over-detecting a negation only costs a cache miss.
+# ============================================================
+NEGATIONS = {
+    "not", "no", "never", "nor", "dont", "doesnt", "cannot", "without",
+    "не", "нет", "ни", "нельзя", "без",
+    "emas", "yo'q", "hech", "na", "эмас", "йўқ", "ҳеч",
+}
+# Uzbek verbs negate with -ma- (sug'ormang, sepmaslik, ekmadi)
+_UZ_NEG = re.compile(r"[\w']{2,}(?:ma|ма)(?:y|s|ng|di|sin|gan|й|с|нг|ди|син|ган)")
+
+
+def signature(text: str) -> tuple:
+    """What must match exactly between a question and a cached one."""
+    norm = normalize(text)
+    words = norm.split()
+    negations = {w for w in words if w in NEGATIONS or w.endswith("n't") or _UZ_NEG.match(w)}
+    return (
+        re.findall(r"\d+", norm),
+        frozenset(agro_terms(norm)),
+        frozenset(negations),
+    )
+
+
+# ============================================================
+# PER-LANGUAGE INDEX (brute-force cosine)
+# ============================================================
+class _Index:
+    def __init__(self):
+        import numpy as np
+
+        self.vecs = np.zeros((64, DIM), dtype=np.float32)
+        self.entries = []   # {"q", "a", "created", "used"}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, vec):
+        """(position, cosine) of the nearest entry, or (None, 0.0)."""
+        if not self.entries:
+            return None, 0.0
+        sims = self.vecs[:len(self.entries)] @ vec
+        pos = int(sims.argmax())
+        return pos, float(sims[pos])
+
+    def add(self, vec, entry: dict):
+        import numpy as np
+
+        n = len(self.entries)
+        if n == len(self.vecs):
+            self.vecs = np.concatenate([self.vecs, np.zeros_like(self.vecs)])
+        self.vecs[n] = vec
+        self.entries.append(entry)
+
+    def remove(self, pos: int):
+        # Swap with the last row: O(1), order does not matter
+        last = len(self.entries) - 1
+        self.vecs[pos] = self.vecs[last]
+        self.entries[pos] = self.entries[last]
+        self.entries.pop()
+
+    def lru(self) -> int:
+        return min(range(len(self.entries)), key=lambda i: self.entries[i]["used"])
+
+
+# ============================================================
+# SEMANTIC ANSWER CACHE
+# ============================================================
+class SemanticCache:
+    """
+    Answers to agricultural questions, keyed by meaning per language.
+
+    get() returns a cached answer when a stored question in the same
+    language has cosine similarity >= threshold and the same signature()
+    (numbers, crop/disease/pest terms, negations). The threshold catches
+    rephrasings of case, punctuation, typos and word order; the
+    signature rejects near-identical questions about another crop or
+    with the opposite meaning. Entries expire after
+    `ttl` seconds; above `max_entries` per language the least recently
+    used one goes. The cache is saved to `path` (JSON, atomic) and
+    loaded on first use; embeddings are recomputed on load.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.9, max_entries: int = 5000,
+                 ttl: float = 7 * 86400, min_chars: int = 12):
+        self.path = path
+        self.threshold = float(threshold)
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.min_chars = int(min_chars)
+
+        self._lock = threading.Lock()
+        self._indexes = None   # lang -> _Index
+        self._dirty = False
+
+        self.hits = 0
+        self.misses = 0
+
+    def _usable(self, question: str) -> bool:
+        # Very short texts ("hi", "help") say too little to match safely
+        return len(normalize(question)) >= self.min_chars
+
+    # ----------------------------
+    # Load / save
+    # ----------------------------
+    def _ensure_loaded(self):
+        if self._indexes is not None:
+            return
+        self._indexes = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning("Semantic cache not loaded: %s", e)
+            return
+
+        cutoff = time.time() - self.ttl
+        for lang, entries in data.get("entries", {}).items():
+            index = self._indexes.setdefault(lang, _Index())
+            for e in entries:
+                if e["created"] > cutoff:
+                    index.add(embed(e["q"]), e)
+        logger.info("Semantic cache: %d answers loaded", sum(map(len, self._indexes.values())))
+
+    def save(self):
+        with self._lock:
+            if not self._dirty or self._indexes is None:
+                return
+            data = {"entries": {lang: list(ix.entries) for lang, ix in self._indexes.items()}}
+            self._dirty = False
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    async def save_loop(self, every: float = 60):
+        """Background task: persist new answers periodically."""
+        while True:
+            await asyncio.sleep(every)
+            try:
+                await asyncio.to_thread(self.save)
+            except Exception as e:
+                logger.warning("Semantic cache save failed: %s", e)
+
+    # ----------------------------
+    # Lookup / insert
+    # ----------------------------
+    def get(self, question: str, lang: str):
+        """Cached answer for a question that means the same, or None."""
+        if not self._usable(question):
+            return None
+
+        vec = embed(question)
+        with self._lock:
+            self._ensure_loaded()
+            index = self._indexes.get(lang)
+            if index is None:
+                self.misses += 1
+                return None
+
+            pos, sim = index.search(vec)
+            if pos is None or sim < self.threshold:
+                self.misses += 1
+                return None
+
+            entry = index.entries[pos]
+            if signature(entry["q"]) != signature(question):
+                self.misses += 1
+                return None
+
+            if time.time() - entry["created"] > self.ttl:
+                index.remove(pos)
+                self._dirty = True
+                self.misses += 1
+                return None
+
+            entry["used"] = time.time()
+            self.hits += 1
+            return entry["a"]
+
+    def put(self, question: str, lang: str, answer: str):
+        if not self._usable(question) or not answer:
+            return
+
+        vec = embed(question)
+        now = time.time()
+        with self._lock:
+            self._ensure_loaded()
+            index = self._indexes.setdefault(lang, _Index())
+
+            # Same question again: refresh the stored answer
+            pos, sim = index.search(vec)
+            if pos is not None and sim >= 0.999:
+                index.entries[pos].update(a=answer, created=now, used=now)
+            else:
+                while len(index) >= self.max_entries:
+                    index.remove(index.lru())
+                index.add(vec, {"q": question, "a": answer, "created": now, "used": now})
+            self._dirty = True
+
+    # Async wrappers: embedding + search run off the event loop
+    async def lookup(self, question: str, lang: str):
+        return await asyncio.to_thread(self.get, question, lang)
+
+    async def store(self, question: str, lang: str, answer: str):
+        await asyncio.to_thread(self.put, question, lang, answer)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        size = sum(map(len, self._indexes.values())) if self._indexes else 0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "size": size,
+        }
+
+
+ANSWER_CACHE = SemanticCache(
+    CFG.get("semantic_cache_path", "users/semantic_cache.json"),
+    threshold=CFG.get("semantic_cache_threshold", 0.9),
+    max_entries=CFG.get("semantic_cache_size", 5000),
+    ttl=CFG.get("semantic_cache_ttl", 7 * 86400),
+)
+atexit.register(ANSWER_CACHE.save)
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+
+logger = logging.getLogger(__name__)
+
+
+def _key(key: StorageKey) -> str:
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+# ============================================================
+# IN-MEMORY FSM STORAGE (single process, bounded)
+# ============================================================
+class MemoryTTLStorage(BaseStorage):
+    """
+    Process-local storage with a hard size cap. An entry expires `ttl`
+    seconds after its last update; when full, the least recently
+    updated entry goes first. Both keep abandoned flows from piling up.
+    """
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 100000):
+        self.ttl = float(ttl)
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()   # key -> (state, data, expires)
+
+    def _evict(self):
+        now = time.monotonic()
+        # Oldest updates sit at the front, so expired entries do too
+        while self._entries:
+            _, (_, _, expires) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def _get(self, key: StorageKey):
+        entry = self._entries.get(_key(key))
+        if entry and entry[2] <= time.monotonic():
+            del self._entries[_key(key)]
+            return None
+        return entry
+
+    def _put(self, key: StorageKey, state: Optional[str], data: dict):
+        k = _key(key)
+        self._entries.pop(k, None)
+        if state is not None or data:
+            self._entries[k] = (state, data, time.monotonic() + self.ttl)
+        self._evict()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = self._get(key)
+        self._put(key, _state_name(state), entry[1] if entry else {})
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        entry = self._get(key)
+        return entry[0] if entry else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        entry = self._get(key)
+        self._put(key, entry[0] if entry else None, dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        entry = self._get(key)
+        return dict(entry[1]) if entry else {}
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+
+# ============================================================
+# SQLITE FSM STORAGE (shared by every worker process)
+# ============================================================
+class SQLiteStorage(BaseStorage):
+    """
+    aiogram FSM storage in one SQLite file (WAL), so any process can
+    continue any chat's conversation and flows survive restarts. Rows
+    not updated for `ttl` seconds are ignored and purged now and then.
+    Calls run in a thread to keep the event loop free.
+    """
+
+    PURGE_EVERY = 600   # seconds
+
+    def __init__(self, db_path: str, ttl: float = 86400):
+        self.ttl = float(ttl)
+        self._next_purge = 0.0
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS fsm (
+                key     TEXT PRIMARY KEY,
+                state   TEXT,
+                data    TEXT NOT NULL DEFAULT '{}',
+                updated REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS fsm_updated ON fsm (updated)")
+        self._db.commit()
+
+    # ----------------------------
+    # Sync helpers (run in a thread)
+    # ----------------------------
+    def _read(self, key: str):
+        with self._lock:
+            return self._db.execute(
+                "SELECT state, data FROM fsm WHERE key = ? AND updated > ?", (key, time.time() - self.ttl)
+            ).fetchone()
+
+    def purge(self) -> int:
+        """Delete expired rows and empty ones; return how many went."""
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "DELETE FROM fsm WHERE updated <= ? OR (state IS NULL AND data = '{}')",
+                (time.time() - self.ttl,)
+            )
+        return cur.rowcount
+
+    def _maybe_purge(self):
+        if time.time() >= self._next_purge:
+            self._next_purge = time.time() + self.PURGE_EVERY
+            removed = self.purge()
+            if removed:
+                logger.info("FSM storage: purged %d stale entries", removed)
+
+    # On conflict an expired row is reset first, so stale halves never resurface
+    def _write_state(self, key: str, state: Optional[str]):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO fsm (key, state, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated = excluded.updated, "
+                "data = CASE WHEN updated > ? THEN data ELSE '{}' END",
+                (key, state, now, now - self.ttl)
+            )
+        self._maybe_purge()
+
+    def _write_data(self, key: str, data: dict):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO fsm (key, data, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET data = excluded.data, updated = excluded.updated, "
+                "state = CASE WHEN updated > ? THEN state ELSE NULL END",
+                (key, json.dumps(data, ensure_ascii=False), now, now - self.ttl)
+            )
+        self._maybe_purge()
+
+    # ----------------------------
+    # BaseStorage
+    # ----------------------------
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await asyncio.to_thread(self._write_state, _key(key), _state_name(state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await asyncio.to_thread(self._read, _key(key))
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._write_data, _key(key), data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await asyncio.to_thread(self._read, _key(key))
+        return json.loads(row[1]) if row else {}
+
+    async def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+# ============================================================
+# FACTORY
+# ============================================================
+def make_storage(cfg: dict) -> BaseStorage:
+    """state_storage: "sqlite" (default, shared, persistent) or "memory"."""
+    ttl = cfg.get("state_ttl", 86400)
+
+    if cfg.get("state_storage", "sqlite") == "memory":
+        if cfg.get("run_mode") == "webhook":
+            logger.warning("Memory FSM storage is per process; webhook workers will not share flows")
+        return MemoryTTLStorage(ttl, cfg.get("state_max_entries", 100000))
+
+    return SQLiteStorage(cfg.get("state_db", "users/state.db"), ttl)
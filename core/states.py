@@ -6,3 +6,5 @@ class UserStates(StatesGroup):
     ask_question = State()
     ask_plant_name = State()
     send_photo = State()
+    weather_days = State()
+    report = State()
@@ -1,13 +1,168 @@
-from core.gpt_client import gpt_yes_no
+import re
+from collections import OrderedDict
 
-ALLOWED_PROMPT = """
-Check if this user message is about farming, agriculture, crops, plants,
-diseases, soil, weather, irrigation, fertilizer, pests, agro-tech,
-or anything related to agriculture.
+from config import CFG
+from core.gpt_client import topic_guard as gpt_topic_guard
 
-Answer only: YES or NO.
-"""
+# ============================================================
+# KEYWORD STEMS (uz / uzc / ru / en)
+# Matched as word prefixes, so "sug'or" covers sug'orish,
+# sug'orishda, ... Stems shorter than 4 letters must match
+# a whole word. AGRO_WORDS are ambiguous as prefixes
+# (bog' -> bog'liq, скот -> скотч, olma -> olmadim) and are
+# matched as whole words only, listing the forms we accept.
+# ============================================================
+AGRO_STEMS = [
+    # uz (Latin)
+    "o'simlik", "ekin", "hosil", "tuproq", "sug'or", "o'g'it", "zararkunanda",
+    "kasallik", "barg", "daraxt", "paxta", "bug'doy", "pomidor",
+    "kartoshka", "uzum", "sabzi", "piyoz", "bodring", "dala", "fermer",
+    "dehqon", "urug'", "ko'chat", "issiqxona", "hashorat", "shira", "chorva",
+    "havo", "yomg'ir", "sovuq", "qurg'oqchilik", "begona o't", "ekish", "o'rim",
+    "qishloq xo'jali", "dehqonchilik", "agronom",
+    # uz (Cyrillic)
+    "ўсимлик", "экин", "ҳосил", "тупроқ", "суғор", "ўғит", "зараркунанда",
+    "касаллик", "барг", "дарахт", "пахта", "буғдой", "помидор",
+    "картошка", "узум", "сабзи", "пиёз", "бодринг", "дала", "деҳқон",
+    "уруғ", "кўчат", "иссиқхона", "ҳашорат", "чорва", "ҳаво", "ёмғир", "совуқ",
+    "қишлоқ хўжали", "деҳқончилик",
+    # ru
+    "растен", "урожа", "почв", "полив", "орошен", "удобрен", "вредител",
+    "болезн", "листья", "листьев", "листвы", "дерев", "огород", "хлоп", "пшениц", "томат",
+    "картоф", "яблон", "яблок", "виноград", "морков", "лук", "огур", "семен",
+    "семян", "рассад", "теплиц", "пестицид", "гербицид", "фунгицид", "фермер",
+    "посев", "посад", "сорняк", "корм", "агро", "погод", "заморозк",
+    "засух", "тля", "сельск", "сельхоз", "скотовод",
+    # en
+    "plant", "crop", "harvest", "soil", "irrigat", "fertili", "pest", "disease",
+    "leaf", "leaves", "orchard", "garden", "cotton", "wheat", "tomato",
+    "potato", "grape", "carrot", "onion", "cucumber",
+    "greenhouse", "herbicide", "fungicide", "farm", "sowing", "weed",
+    "livestock", "cattle", "agri", "agro", "blight", "mildew", "aphid",
+    "compost", "manure", "yield", "weather", "frost", "drought",
+]
 
-async def is_allowed_topic(text: str):
-    ans = await gpt_yes_no(ALLOWED_PROMPT + "\nMessage: " + text)
-    return ans == "YES"
+AGRO_WORDS = [
+    "bog'", "bog'da", "bog'im", "bog'imda", "bog'dagi", "bog'lar", "bog'ni",
+    "olma", "olmalar", "olmaning", "olmani", "olmada",
+    "боғ", "боғда", "боғдаги", "олма", "олмалар",
+    "лист", "листа", "листе", "листах",
+    "сад", "сада", "саду", "саде", "садов",
+    "скот", "скота", "скоту", "скотом",
+    "apple", "apples", "seed", "seeds", "seedling", "seedlings",
+    "tree", "trees",
+]
+
+OFFTOPIC_STEMS = [
+    # uz (Latin)
+    "futbol", "kino", "film", "musiqa", "qo'shiq", "kripto", "dastur",
+    "o'yin", "siyosat", "sevgi", "latifa",
+    # uz (Cyrillic)
+    "футбол", "кино", "мусиқа", "қўшиқ", "крипто", "дастур", "ўйин",
+    "сиёсат", "севги", "латифа",
+    # ru
+    "фильм", "музык", "песн", "биткоин", "программ", "игр", "политик",
+    "выбор", "анекдот", "любов",
+    # en
+    "football", "movie", "music", "song", "bitcoin", "crypto", "python",
+    "javascript", "programming", "game", "politic", "election", "joke",
+    "dating", "celebrit",
+]
+
+
+def _compile(stems, words=()):
+    long_ = [re.escape(s) for s in stems if len(s) >= 4]
+    short = [re.escape(s) for s in stems if len(s) < 4] + [re.escape(w) for w in words]
+    parts = []
+    if long_:
+        parts.append(r"(?<![\w'])(?:" + "|".join(long_) + r")")
+    if short:
+        parts.append(r"(?<![\w'])(?:" + "|".join(short) + r")(?![\w'])")
+    return re.compile("|".join(parts))
+
+
+_AGRO_RE = _compile(AGRO_STEMS, AGRO_WORDS)
+_OFF_RE = _compile(OFFTOPIC_STEMS)
+_APOSTROPHES = str.maketrans({c: "'" for c in "‘’ʻʼ`´"})
+
+
+# ============================================================
+# LOCAL CLASSIFIER
+# ============================================================
+def normalize(text: str) -> str:
+    text = text.casefold().translate(_APOSTROPHES)
+    return " ".join(re.findall(r"[\w']+", text))
+
+
+def agro_terms(text: str) -> set:
+    """Agro stems found in the text ("pomidorlarim" -> {"pomidor"})."""
+    return set(_AGRO_RE.findall(normalize(text)))
+
+
+def local_topic_score(text: str) -> float:
+    """
+    Probability-like agriculture score in 0..1 from keyword hits.
+    0.5 means "no evidence either way".
+    """
+    norm = normalize(text)
+    agro = len(_AGRO_RE.findall(norm))
+    off = len(_OFF_RE.findall(norm))
+    return (2 * agro + 1) / (2 * agro + 2 * off + 2)
+
+
+# Score that must be exceeded to decide locally; in between ask GPT.
+# One keyword alone scores exactly 0.75 (1 hit) / 0.25 and is not enough.
+CONFIDENT = CFG.get("topic_guard_confidence", 0.75)
+
+
+def local_topic_verdict(text: str):
+    """True / False if the local score is confident, else None."""
+    score = local_topic_score(text)
+    if score > CONFIDENT:
+        return True
+    if score < 1 - CONFIDENT:
+        return False
+    return None
+
+
+# ============================================================
+# VERDICT CACHE
+# ============================================================
+_CACHE = OrderedDict()
+CACHE_SIZE = CFG.get("topic_guard_cache_size", 2000)
+
+
+def _remember(key: str, verdict: bool):
+    _CACHE[key] = verdict
+    _CACHE.move_to_end(key)
+    while len(_CACHE) > CACHE_SIZE:
+        _CACHE.popitem(last=False)
+
+
+def quick_verdict(text: str):
+    """Cached or confident local verdict, without any network call."""
+    key = normalize(text)
+    if key in _CACHE:
+        _CACHE.move_to_end(key)
+        return _CACHE[key]
+    return local_topic_verdict(text)
+
+
+def remember_verdict(text: str, verdict: bool):
+    """Store a verdict decided elsewhere (e.g. by the combined GPT call)."""
+    _remember(normalize(text), verdict)
+
+
+async def is_allowed_topic(text: str) -> bool:
+    """Local keyword check first; GPT only for ambiguous text."""
+    key = normalize(text)
+    if key in _CACHE:
+        _CACHE.move_to_end(key)
+        return _CACHE[key]
+
+    verdict = local_topic_verdict(text)
+    if verdict is None:
+        verdict = await gpt_topic_guard(text)
+
+    _remember(key, verdict)
+    return verdict
@@ -1,45 +1,7 @@
-import os
-import json
-from datetime import datetime
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
-
-# ============================================================
-# INTERNAL HELPERS
-# ============================================================
-def _user_dir(user_id: str) -> str:
-    """Return directory path for user."""
-    return os.path.join("users", user_id)
-
-
-def _user_file(user_id: str) -> str:
-    """Return user.json file path."""
-    return os.path.join("users", user_id, "user.json")
-
-
-def _load_user(user_id: str) -> dict:
-    """
-    Safely load user.json.
-    Return {} if file does not exist OR JSON is invalid.
-    """
-    file = _user_file(user_id)
-
-    if not os.path.exists(file):
-        return {}
-
-    try:
-        with open(file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return data if isinstance(data, dict) else {}
-    except Exception:
-        return {}  # corrupted or unreadable JSON
-
-
-def _save_user(user_id: str, data: dict):
-    """Safely save user.json, create directory if missing."""
-    os.makedirs(_user_dir(user_id), exist_ok=True)
-
-    with open(_user_file(user_id), "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+from core.user_store import STORE
 
 
 # ============================================================
@@ -47,16 +9,11 @@ def _save_user(user_id: str, data: dict):
 # ============================================================
 def save_user(user_id: str):
     """
-    Initialize user.json if missing.
+    Initialize the profile if missing.
     Do not overwrite existing settings.
     """
-    data = _load_user(user_id)
-
-    # Ensure at least language exists
-    if "lang" not in data:
-        data["lang"] = "en"
-
-    _save_user(user_id, data)
+    if "lang" not in STORE.get(user_id):
+        STORE.update(user_id, lang="en")
 
 
 # ============================================================
@@ -64,59 +21,111 @@ def save_user(user_id: str):
 # ============================================================
 def get_user_lang(user_id: str) -> str:
     """Returns user language or 'en'."""
-    data = _load_user(user_id)
-    return data.get("lang", "en")
+    return STORE.get(user_id).get("lang", "en")
 
 
 def set_user_lang(user_id: str, lang: str):
-    """Save language to user.json."""
-    data = _load_user(user_id)
-    data["lang"] = lang
-    _save_user(user_id, data)
+    """Save user's language."""
+    STORE.update(user_id, lang=lang)
 
 
 # ============================================================
 # LOCATION MANAGEMENT
 # ============================================================
 def save_user_location(user_id: str, lat: float, lon: float):
-    """Store location inside user.json."""
-    data = _load_user(user_id)
-    data["location"] = {"lat": float(lat), "lon": float(lon)}
-    _save_user(user_id, data)
+    """Store location in the user's profile."""
+    STORE.update(user_id, location={"lat": float(lat), "lon": float(lon)})
 
 
 def get_user_location(user_id: str):
     """Return location dict or None."""
-    data = _load_user(user_id)
-    loc = data.get("location")
+    loc = STORE.get(user_id).get("location")
     if isinstance(loc, dict) and "lat" in loc and "lon" in loc:
         return loc
     return None
 
 
+def iter_user_locations():
+    """Yield (user_id, location, lang) for every user with a saved location."""
+    for user_id, data in STORE.iter_users():
+        loc = data.get("location")
+        if isinstance(loc, dict) and "lat" in loc and "lon" in loc:
+            yield user_id, loc, data.get("lang", "en")
+
+
+def all_user_ids() -> list:
+    """Every stored user id (broadcast recipients)."""
+    return [user_id for user_id, _ in STORE.iter_users()]
+
+
+def sent_alerts(since: str) -> set:
+    """Weather alerts already pushed: {(user_id, cell, date, kind)}."""
+    return STORE.sent_alerts(since)
+
+
+def record_alerts(rows: list, before: str = None):
+    STORE.record_alerts(rows, before)
+
+
 # ============================================================
 # REPORT HANDLING
 # ============================================================
 def save_user_report(user_id: str, text: str) -> str:
     """
     Save user-submitted report.
-    Return saved file path.
+    Return saved report name.
     """
-    report_dir = os.path.join("users", user_id, "reports")
-    os.makedirs(report_dir, exist_ok=True)
+    return STORE.add_report(user_id, text)
+
 
-    filename = f"report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-    path = os.path.join(report_dir, filename)
+def get_all_reports(user_id: str):
+    """Return a sorted list of all report names."""
+    return STORE.report_names(user_id)
 
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(text)
 
-    return path
+# ============================================================
+# ASYNC API (for aiogram handlers)
+# Memory hits are answered inline; anything that may touch the
+# disk runs on a small dedicated thread pool, so a slow disk
+# never stalls the event loop.
+# ============================================================
+_IO = ThreadPoolExecutor(max_workers=2, thread_name_prefix="user-io")
 
 
-def get_all_reports(user_id: str):
-    """Return a sorted list of all report filenames."""
-    report_dir = os.path.join("users", user_id, "reports")
-    if not os.path.exists(report_dir):
-        return []
-    return sorted(os.listdir(report_dir))
+async def _offload(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_IO, fn, *args)
+
+
+async def _profile(user_id: str) -> dict:
+    data = STORE.peek(user_id)
+    if data is None:
+        data = await _offload(STORE.get, user_id)
+    return data
+
+
+async def save_user_async(user_id: str):
+    if "lang" not in await _profile(user_id):
+        STORE.update(user_id, lang="en")
+
+
+async def get_user_lang_async(user_id: str) -> str:
+    return (await _profile(user_id)).get("lang", "en")
+
+
+async def set_user_lang_async(user_id: str, lang: str):
+    await _offload(set_user_lang, user_id, lang)
+
+
+async def save_user_location_async(user_id: str, lat: float, lon: float):
+    await _offload(save_user_location, user_id, lat, lon)
+
+
+async def get_user_location_async(user_id: str):
+    loc = (await _profile(user_id)).get("location")
+    if isinstance(loc, dict) and "lat" in loc and "lon" in loc:
+        return loc
+    return None
+
+
+async def save_user_report_async(user_id: str, text: str) -> str:
+    return await _offload(save_user_report, user_id, text)
@@ -1,20 +1,379 @@
+import atexit
 import json
+import logging
 import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
 
-BASE = "users"
+from config import CFG
 
-if not os.path.exists(BASE):
-    os.makedirs(BASE)
+logger = logging.getLogger(__name__)
 
-def user_file(uid):
-    return os.path.join(BASE, f"{uid}.json")
 
-def load_user(uid):
-    path = user_file(uid)
-    if not os.path.exists(path):
-        return {"id": uid, "lang": "en"}  # default
-    return json.load(open(path, "r", encoding="utf-8"))
+# ============================================================
+# USER PROFILE STORE
+# SQLite (WAL) + in-memory read-through cache + write-behind
+# ============================================================
+class UserStore:
+    """
+    Profiles are small JSON dicts ({"lang": ..., "location": {...}}).
 
-def save_user(uid, data):
-    path = user_file(uid)
-    json.dump(data, open(path, "w", encoding="utf-8"), ensure_ascii=False, indent=2)
+    Reads hit the in-memory LRU first and fall through to SQLite.
+    Writes update memory immediately and are flushed to SQLite in
+    batches by a background thread every `flush_interval` seconds
+    (or sooner once `flush_batch` changes are pending).
+    """
+
+    def __init__(self, db_path: str, cache_size: int = 10000,
+                 flush_interval: float = 1.0, flush_batch: int = 500):
+        self.db_path = db_path
+        self.cache_size = max(1, int(cache_size))
+        self.flush_interval = float(flush_interval)
+        self.flush_batch = max(1, int(flush_batch))
+
+        self._lock = threading.RLock()      # memory state
+        self._db_lock = threading.Lock()    # the SQLite connection
+        self._cache = OrderedDict()   # user_id -> profile
+        self._dirty = {}              # user_id -> profile waiting for flush
+        self._flushing = {}           # user_id -> profile being written right now
+        self._reports = []            # (user_id, name, text, created) waiting for flush
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id TEXT PRIMARY KEY,
+                data    TEXT NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS reports (
+                id      INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                name    TEXT NOT NULL,
+                text    TEXT NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS reports_user ON reports (user_id);
+            CREATE TABLE IF NOT EXISTS meta (
+                key   TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS alerts (
+                user_id TEXT NOT NULL,
+                cell    TEXT NOT NULL,
+                date    TEXT NOT NULL,
+                kind    TEXT NOT NULL,
+                PRIMARY KEY (user_id, cell, date, kind)
+            );
+        """)
+        self._db.commit()
+
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = threading.Thread(target=self._flush_loop, name="user-store-flush", daemon=True)
+        self._thread.start()
+
+    # ----------------------------
+    # Cache helpers
+    # ----------------------------
+    def _remember(self, user_id: str, data: dict):
+        self._cache[user_id] = data
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _read_db(self, user_id: str) -> dict:
+        with self._db_lock:
+            row = self._db.execute("SELECT data FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        if not row:
+            return {}
+        try:
+            data = json.loads(row[0])
+            return data if isinstance(data, dict) else {}
+        except Exception:
+            return {}
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+    def _in_memory(self, user_id: str):
+        """Latest profile held in memory, or None. Caller holds _lock."""
+        for pending in (self._dirty, self._flushing):
+            if user_id in pending:
+                return pending[user_id]
+        if user_id in self._cache:
+            self._cache.move_to_end(user_id)
+            return self._cache[user_id]
+        return None
+
+    def peek(self, user_id: str):
+        """Copy of the profile if it is in memory, else None (never touches disk)."""
+        with self._lock:
+            data = self._in_memory(user_id)
+            return dict(data) if data is not None else None
+
+    def get(self, user_id: str) -> dict:
+        """Return a copy of the profile ({} if unknown)."""
+        with self._lock:
+            data = self._in_memory(user_id)
+            if data is not None:
+                return dict(data)
+
+        # Miss: read SQLite without holding the memory lock
+        loaded = self._read_db(user_id)
+
+        with self._lock:
+            data = self._in_memory(user_id)
+            if data is None:
+                data = loaded
+                self._remember(user_id, data)
+            return dict(data)
+
+    def update(self, user_id: str, **fields):
+        """Merge fields into the profile (write-behind)."""
+        self.get(user_id)  # make sure it is in memory
+
+        with self._lock:
+            data = dict(self._in_memory(user_id) or {})
+            data.update(fields)
+            self._remember(user_id, data)
+            self._dirty[user_id] = data
+            pending = len(self._dirty)
+
+        if pending >= self.flush_batch:
+            self._wake.set()
+
+    def add_report(self, user_id: str, text: str, name: str = None, created: float = None) -> str:
+        """Queue a report; return its name (report_YYYYmmdd_HHMMSS.txt)."""
+        created = created or time.time()
+        name = name or f"report_{datetime.fromtimestamp(created).strftime('%Y%m%d_%H%M%S')}.txt"
+        with self._lock:
+            self._reports.append((user_id, name, text, created))
+        self._wake.set()
+        return name
+
+    def report_names(self, user_id: str) -> list:
+        self.flush()
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT name FROM reports WHERE user_id = ? ORDER BY name", (user_id,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def iter_users(self):
+        """Yield (user_id, profile) for every stored user."""
+        self.flush()
+        with self._db_lock:
+            rows = self._db.execute("SELECT user_id, data FROM users").fetchall()
+        for user_id, raw in rows:
+            try:
+                yield user_id, json.loads(raw)
+            except Exception:
+                continue
+
+    # ----------------------------
+    # Sent weather alerts (survive restarts)
+    # ----------------------------
+    def sent_alerts(self, since: str) -> set:
+        """{(user_id, cell, date, kind)} for event dates >= since (YYYY-MM-DD)."""
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT user_id, cell, date, kind FROM alerts WHERE date >= ?", (since,)
+            ).fetchall()
+        return set(rows)
+
+    def record_alerts(self, rows: list, before: str = None):
+        """Remember sent alerts; drop the ones for event dates < `before`."""
+        with self._db_lock, self._db:
+            self._db.executemany("INSERT OR IGNORE INTO alerts VALUES (?, ?, ?, ?)", rows)
+            if before:
+                self._db.execute("DELETE FROM alerts WHERE date < ?", (before,))
+
+    # ----------------------------
+    # Write-behind flushing
+    # ----------------------------
+    def flush(self):
+        with self._db_lock:
+            with self._lock:
+                if not self._dirty and not self._reports:
+                    return
+                users, self._dirty = self._dirty, {}
+                reports, self._reports = self._reports, []
+                self._flushing = users
+
+            # Readers are not blocked while SQLite writes
+            now = time.time()
+            try:
+                with self._db:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO users (user_id, data, updated) VALUES (?, ?, ?)",
+                        [(uid, json.dumps(d, ensure_ascii=False), now) for uid, d in users.items()]
+                    )
+                    self._db.executemany(
+                        "INSERT INTO reports (user_id, name, text, created) VALUES (?, ?, ?, ?)",
+                        reports
+                    )
+            except Exception:
+                # Keep the changes for the next attempt (newer edits win)
+                logger.exception("User store flush failed")
+                with self._lock:
+                    for uid, d in users.items():
+                        self._dirty.setdefault(uid, d)
+                    self._reports = reports + self._reports
+            finally:
+                with self._lock:
+                    self._flushing = {}
+
+    def _flush_loop(self):
+        while not self._stop:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        self._stop = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        self._db.close()
+
+    # ----------------------------
+    # Migration meta
+    # ----------------------------
+    def get_meta(self, key: str):
+        with self._db_lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._db_lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def claim_meta(self, key: str, value: str, free=lambda v: not v) -> bool:
+        """
+        Set `key` only if `free(current value)` (default: unset or empty).
+        Atomic across processes.
+        """
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+                if not free(row[0] if row else None):
+                    self._db.execute("ROLLBACK")
+                    return False
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+                self._db.execute("COMMIT")
+                return True
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+
+# ============================================================
+# ONE-SHOT MIGRATION FROM users/<id>/user.json
+# ============================================================
+def _read_json(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+# A claim older than this belongs to a process that died mid-migration
+MIGRATION_STALE = 600
+_RUNNING = "running:"
+
+
+def _migration_free(value) -> bool:
+    if not value:
+        return True
+    if value.startswith(_RUNNING):
+        try:
+            return time.time() - float(value[len(_RUNNING):]) > MIGRATION_STALE
+        except ValueError:
+            return True
+    return False
+
+
+def migrate_json_tree(store: UserStore, users_dir: str = "users") -> int:
+    """
+    Import users/<id>/user.json (+ users/<id>/reports/*.txt) and the older
+    flat users/<id>.json files. Runs once; returns number of users imported.
+    Processes starting together (webhook workers) race for the meta key;
+    only the one that claims it migrates. Only numeric (Telegram id)
+    names are imported: users/ also holds caches such as
+    semantic_cache.json.
+    """
+    if not os.path.isdir(users_dir):
+        return 0
+    if not store.claim_meta("json_migrated", f"{_RUNNING}{time.time()}", _migration_free):
+        return 0
+
+    try:
+        count = _import_users(store, users_dir)
+    except Exception:
+        # Let the next start (or python -m core.user_store) try again
+        store.set_meta("json_migrated", "")
+        raise
+
+    store.set_meta("json_migrated", time.strftime("%Y-%m-%dT%H:%M:%S"))
+    logger.info("Migrated %d users from %s", count, users_dir)
+    return count
+
+
+def _import_users(store: UserStore, users_dir: str) -> int:
+    count = 0
+    for entry in sorted(os.listdir(users_dir)):
+        path = os.path.join(users_dir, entry)
+
+        if os.path.isdir(path):
+            user_id = entry
+            data = _read_json(os.path.join(path, "user.json"))
+        elif entry.endswith(".json"):
+            user_id = entry[:-5]
+            data = _read_json(path)
+            data.pop("id", None)
+        else:
+            continue
+
+        if not user_id.lstrip("-").isdigit():
+            continue
+
+        if data:
+            # Profiles written by the new store win over old files
+            store.update(user_id, **{**data, **store.get(user_id)})
+            count += 1
+
+        report_dir = os.path.join(path, "reports")
+        if os.path.isdir(report_dir):
+            for name in sorted(os.listdir(report_dir)):
+                file = os.path.join(report_dir, name)
+                with open(file, "r", encoding="utf-8", errors="replace") as f:
+                    text = f.read()
+                store.add_report(user_id, text, name=name, created=os.path.getmtime(file))
+
+    store.flush()
+    return count
+
+
+STORE = UserStore(
+    CFG.get("user_db", "users/users.db"),
+    cache_size=CFG.get("user_cache_size", 10000),
+    flush_interval=CFG.get("user_flush_interval", 1.0),
+    flush_batch=CFG.get("user_flush_batch", 500),
+)
+migrate_json_tree(STORE)
+atexit.register(STORE.close)
+
+
+if __name__ == "__main__":
+    # python -m core.user_store   → (re)run the JSON migration
+    STORE.set_meta("json_migrated", "")
+    print("Imported users:", migrate_json_tree(STORE))
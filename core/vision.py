@@ -0,0 +1,166 @@
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+import math
+from collections import OrderedDict
+
+from config import CFG
+from core.ingest import open_reduced
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# OPENAI IMAGE TOKEN ACCOUNTING
+# detail=low: fixed base cost, image seen at <= 512 px.
+# detail=high: image fitted into 2048 px, short side scaled to
+# 768 px, then base + per_tile * number of 512 px tiles.
+# ============================================================
+TOKEN_COSTS = {
+    "gpt-4o-mini": (2833, 5667),
+    "default": (85, 170),   # gpt-4o, gpt-4.1, ...
+}
+TILE = 512
+LOW_SIDE = 512
+
+# High-detail budget in gpt-4o units (765 = 2x2 tiles); other models get
+# the same number of tiles unless vision_token_budgets sets their own
+TOKEN_BUDGET = CFG.get("vision_token_budget", 765)
+MODEL_BUDGETS = CFG.get("vision_token_budgets", {})
+MAX_SIDE = CFG.get("vision_max_side", 1024)
+MAX_BYTES = CFG.get("vision_max_bytes", 300_000)
+QUALITIES = {"low": (70, 60, 50), "high": (85, 75, 65, 50)}
+
+
+def _scale_to(w: int, h: int, factor: float):
+    return max(1, round(w * factor)), max(1, round(h * factor))
+
+
+def api_dims(w: int, h: int) -> tuple:
+    """Size the API works on for a detail=high image."""
+    if max(w, h) > 2048:
+        w, h = _scale_to(w, h, 2048 / max(w, h))
+    if min(w, h) > 768:
+        w, h = _scale_to(w, h, 768 / min(w, h))
+    return w, h
+
+
+def image_tokens(w: int, h: int, detail: str, model: str = "gpt-4o") -> int:
+    base, per_tile = TOKEN_COSTS.get(model, TOKEN_COSTS["default"])
+    if detail == "low":
+        return base
+    w, h = api_dims(w, h)
+    return base + per_tile * math.ceil(w / TILE) * math.ceil(h / TILE)
+
+
+def token_budget(model: str = "gpt-4o") -> int:
+    """High-detail budget in `model`'s own token units."""
+    if model in MODEL_BUDGETS:
+        return MODEL_BUDGETS[model]
+    # Same tile count as TOKEN_BUDGET buys on gpt-4o
+    tiles = (TOKEN_BUDGET - TOKEN_COSTS["default"][0]) // TOKEN_COSTS["default"][1]
+    base, per_tile = TOKEN_COSTS.get(model, TOKEN_COSTS["default"])
+    return base + per_tile * tiles
+
+
+def target_size(w: int, h: int, detail: str, budget: int = None, model: str = "gpt-4o") -> tuple:
+    """
+    Largest size (same aspect) that the API would not shrink further and
+    that fits `budget` (default: token_budget(model)), counted in
+    `model`'s token units.
+    """
+    if detail == "low":
+        return _scale_to(w, h, min(1.0, LOW_SIDE / max(w, h)))
+
+    if budget is None:
+        budget = token_budget(model)
+    w, h = api_dims(w, h)
+    if max(w, h) > MAX_SIDE:
+        w, h = _scale_to(w, h, MAX_SIDE / max(w, h))
+    while image_tokens(w, h, "high", model) > budget and min(w, h) > TILE // 2:
+        w, h = _scale_to(w, h, 0.9)
+    return w, h
+
+
+# ============================================================
+# PREPARE (sync, CPU-bound)
+# ============================================================
+def prepare_image(data, detail: str = "high", budget: int = None, model: str = "gpt-4o") -> dict:
+    """
+    Resize to `model`'s token budget and pick the highest JPEG quality that
+    fits MAX_BYTES. Return {"b64", "bytes", "size", "quality", "tokens"}.
+    """
+    img = open_reduced(data, (LOW_SIDE, LOW_SIDE) if detail == "low" else (768, 768))
+    size = target_size(*img.size, detail, budget, model)
+    if size != img.size:
+        img = img.resize(size)
+
+    for quality in QUALITIES[detail]:
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=quality, optimize=True)
+        if buf.tell() <= MAX_BYTES:
+            break
+
+    jpeg = buf.getbuffer()
+    return {
+        "b64": base64.b64encode(jpeg).decode("ascii"),
+        "bytes": jpeg.nbytes,
+        "size": size,
+        "quality": quality,
+        "tokens": image_tokens(*size, detail, model),
+    }
+
+
+# ============================================================
+# PAYLOAD CACHE + STATS
+# Several calls for one photo (leaf gate, diagnosis, retries)
+# reuse the same encoded payload.
+# ============================================================
+_PAYLOADS = OrderedDict()   # (sha256, detail, model) -> Future[dict]
+PAYLOAD_CACHE_SIZE = CFG.get("vision_payload_cache", 64)
+
+STATS = {d: {"calls": 0, "bytes": 0, "tokens": 0} for d in ("low", "high")}
+
+
+def vision_stats() -> dict:
+    return {d: dict(s) for d, s in STATS.items()}
+
+
+async def _payload(data, detail: str, model: str) -> dict:
+    # Low detail ignores the model's budget, so all models share one payload
+    key = (hashlib.sha256(data).hexdigest(), detail, model if detail == "high" else None)
+    fut = _PAYLOADS.get(key)
+    if fut is None:
+        fut = _PAYLOADS[key] = asyncio.ensure_future(
+            asyncio.to_thread(prepare_image, data, detail, None, model)
+        )
+        while len(_PAYLOADS) > PAYLOAD_CACHE_SIZE:
+            _PAYLOADS.popitem(last=False)
+    else:
+        _PAYLOADS.move_to_end(key)
+
+    try:
+        return await asyncio.shield(fut)
+    except Exception:
+        if _PAYLOADS.get(key) is fut:
+            del _PAYLOADS[key]
+        raise
+
+
+async def image_part(data, detail: str = "high", model: str = "gpt-4o") -> dict:
+    """Chat-completions content part for an image, prepared for `detail`."""
+    p = await _payload(data, detail, model)
+
+    tokens = p["tokens"] if detail == "high" else image_tokens(*p["size"], detail, model)
+    s = STATS[detail]
+    s["calls"] += 1
+    s["bytes"] += p["bytes"]
+    s["tokens"] += tokens
+    logger.info("Vision %s/%s: %dx%d q%d, %d bytes, %d tokens",
+                model, detail, *p["size"], p["quality"], p["bytes"], tokens)
+
+    return {
+        "type": "image_url",
+        "image_url": {"url": f"data:image/jpeg;base64,{p['b64']}", "detail": detail},
+    }
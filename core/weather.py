@@ -1,6 +1,15 @@
-import requests
+import asyncio
+import logging
+import math
+import time
 from datetime import datetime
 
+import httpx
+
+from config import CFG
+
+logger = logging.getLogger(__name__)
+
 # ---------------------------------------------------------
 # MULTILINGUAL WEATHER DESCRIPTIONS
 # ---------------------------------------------------------
@@ -116,24 +125,116 @@ WEATHER_CODE_MAP = {
 }
 
 # ---------------------------------------------------------
-# FETCH WEATHER DATA
+# GRID CELLS
+# Nearby farmers share one forecast: coordinates are snapped
+# to the centre of a `weather_grid_deg` cell (0.1° ≈ 11 km).
 # ---------------------------------------------------------
-def get_weather(lat, lon, days: int):
-    url = (
-        f"https://api.open-meteo.com/v1/forecast"
-        f"?latitude={lat}&longitude={lon}"
-        "&daily=weathercode,temperature_2m_max,temperature_2m_min,"
-        "precipitation_sum,windspeed_10m_max"
-        "&timezone=Asia/Tashkent"
-        f"&forecast_days={min(days, 16)}"
-    )
-
-    try:
-        resp = requests.get(url, timeout=10)
+GRID_DEG = CFG.get("weather_grid_deg", 0.1)
+
+
+def snap_to_grid(lat, lon, step: float = GRID_DEG):
+    """Return the (lat, lon) centre of the grid cell containing the point."""
+    def snap(v):
+        # Round the quotient first: 0.3 / 0.1 is 2.9999999999999996 in floats,
+        # and a point on a cell edge must land in the cell that starts there
+        return round((math.floor(round(float(v) / step, 9)) + 0.5) * step, 4)
+    return snap(lat), snap(lon)
+
+
+# ---------------------------------------------------------
+# WEATHER SERVICE (async, cached, coalesced)
+# ---------------------------------------------------------
+class WeatherService:
+    """
+    Open-Meteo client shared by all users.
+
+    - one pooled httpx.AsyncClient
+    - TTL cache per (cell, days)
+    - identical in-flight requests share one upstream fetch
+    - the last known forecast is served if the upstream fails
+    """
+
+    URL = "https://api.open-meteo.com/v1/forecast"
+
+    def __init__(self, ttl: float = 1800, stale_max: float = 86400,
+                 max_entries: int = 5000, timeout: float = 10):
+        self.ttl = float(ttl)
+        self.stale_max = float(stale_max)
+        self.max_entries = int(max_entries)
+        self.timeout = float(timeout)
+
+        self._cache = {}      # (lat, lon, days) -> (fetched_at, data)
+        self._inflight = {}   # (lat, lon, days) -> asyncio.Task
+        self._client = None
+
+        self.upstream_calls = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+            )
+        return self._client
+
+    async def _fetch(self, key):
+        lat, lon, days = key
+        params = {
+            "latitude": lat,
+            "longitude": lon,
+            "daily": "weathercode,temperature_2m_max,temperature_2m_min,"
+                     "precipitation_sum,windspeed_10m_max",
+            "timezone": CFG.get("timezone", "Asia/Tashkent"),
+            "forecast_days": days,
+        }
+
+        self.upstream_calls += 1
+        resp = await self.client.get(self.URL, params=params)
         resp.raise_for_status()
-        return resp.json()
-    except:
-        return None
+        data = resp.json()
+
+        self._cache[key] = (time.time(), data)
+        if len(self._cache) > self.max_entries:
+            oldest = min(self._cache, key=lambda k: self._cache[k][0])
+            self._cache.pop(oldest, None)
+        return data
+
+    async def get(self, lat, lon, days: int):
+        """Forecast dict for the point's grid cell, or None."""
+        key = (*snap_to_grid(lat, lon), min(int(days), 16))
+
+        cached = self._cache.get(key)
+        if cached and time.time() - cached[0] < self.ttl:
+            return cached[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._fetch(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        try:
+            # shield: one caller giving up must not cancel the others' fetch
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Weather fetch failed for %s: %s", key, e)
+            if cached and time.time() - cached[0] < self.stale_max:
+                return cached[1]
+            return None
+
+
+WEATHER = WeatherService(
+    ttl=CFG.get("weather_cache_ttl", 1800),
+    stale_max=CFG.get("weather_stale_max", 86400),
+    max_entries=CFG.get("weather_cache_size", 5000),
+)
+
+
+async def get_weather(lat, lon, days: int):
+    return await WEATHER.get(lat, lon, days)
 
 
 # ---------------------------------------------------------
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+
+from config import CFG
+from core.language_manager import t as tr
+from core.user_manager import iter_user_locations, sent_alerts, record_alerts
+from core.weather import get_weather, snap_to_grid
+
+logger = logging.getLogger(__name__)
+
+FROST_C = CFG.get("alert_frost_c", 0)
+RAIN_MM = CFG.get("alert_rain_mm", 20)
+WIND_KMH = CFG.get("alert_wind_kmh", 50)
+
+
+# ============================================================
+# RISK DETECTION (Open-Meteo daily data)
+# ============================================================
+def detect_risks(data: dict) -> list:
+    """Return [(date, kind, value), ...] for frost, heavy rain and wind."""
+    d = data["daily"]
+    risks = []
+
+    for i, date in enumerate(d["time"]):
+        tmin = d["temperature_2m_min"][i]
+        rain = d["precipitation_sum"][i]
+        wind = d["windspeed_10m_max"][i]
+
+        if tmin is not None and tmin <= FROST_C:
+            risks.append((date, "frost", tmin))
+        if rain is not None and rain >= RAIN_MM:
+            risks.append((date, "heavy_rain", rain))
+        if wind is not None and wind >= WIND_KMH:
+            risks.append((date, "wind", wind))
+
+    return risks
+
+
+def render_alert(risks: list, lang: str) -> str:
+    lines = [f"<b>{tr(lang, 'alert_title')}</b>", ""]
+    for date, kind, value in risks:
+        day = datetime.strptime(date, "%Y-%m-%d").strftime("%d/%m")
+        lines.append(tr(lang, f"alert_{kind}").format(date=day, value=value))
+    return "\n".join(lines)
+
+
+# ============================================================
+# SCHEDULER
+# One forecast fetch per grid cell, however many users live in it.
+# Sent alerts are recorded per user in the user DB, so restarts do
+# not repeat them and users who join a cell later still get them.
+# ============================================================
+async def run_alerts(send, days: int = 3) -> dict:
+    """
+    Group saved user locations by grid cell, fetch each cell once and
+    push new risk events. `send(user_id, text)` is an async callable
+    (normally BroadcastQueue.enqueue).
+    """
+    users = await asyncio.to_thread(lambda: list(iter_user_locations()))
+
+    cells = defaultdict(list)
+    for user_id, loc, lang in users:
+        cells[snap_to_grid(loc["lat"], loc["lon"])].append((user_id, lang))
+
+    alerts = 0
+    today = datetime.now().strftime("%Y-%m-%d")
+    sent = await asyncio.to_thread(sent_alerts, today)
+
+    for cell, members in cells.items():
+        data = await get_weather(cell[0], cell[1], days)
+        if not data:
+            continue
+
+        risks = detect_risks(data)
+        if not risks:
+            continue
+
+        cell_key = f"{cell[0]},{cell[1]}"
+        texts, done = {}, []
+        for user_id, lang in members:
+            new = [r for r in risks if (user_id, cell_key, r[0], r[1]) not in sent]
+            if not new:
+                continue
+            # Text depends on language and on which events are new to this user
+            key = (lang, tuple(new))
+            if key not in texts:
+                texts[key] = render_alert(new, lang)
+            await send(user_id, texts[key])
+            done.extend((user_id, cell_key, date, kind) for date, kind, _ in new)
+            alerts += 1
+
+        if done:
+            await asyncio.to_thread(record_alerts, done)
+
+    # Forget events that are in the past
+    await asyncio.to_thread(record_alerts, [], today)
+
+    stats = {"users": len(users), "cells": len(cells), "alerts": alerts}
+    logger.info("Weather alerts: %s", stats)
+    return stats
+
+
+async def alert_loop(send, every_hours: float, days: int = 3):
+    while True:
+        try:
+            await run_alerts(send, days)
+        except Exception:
+            logger.exception("Weather alert run failed")
+        await asyncio.sleep(every_hours * 3600)
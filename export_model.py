@@ -0,0 +1,135 @@
+"""
+Export the disease model for the faster inference backends and check
+that they agree with the eager model.
+
+Artifacts (paths from config.json):
+    torchscript_path  frozen TorchScript            (inference_backend: torchscript)
+    int8_path         TorchScript, INT8 Linear only (inference_backend: int8_linear)
+    onnx_path         ONNX graph for onnxruntime    (inference_backend: onnx)
+
+--onnx-int8 additionally writes an onnxruntime dynamic-INT8 copy
+(<onnx_path>.int8.onnx), which also quantizes the convolutions; point
+onnx_path at it to use it. This is the INT8 option that speeds up the
+network; int8_linear leaves the convolutions in fp32.
+
+Usage:
+    python export_model.py                       # all artifacts
+    python export_model.py --onnx --check DATA/val
+"""
+import argparse
+import os
+import sys
+import time
+
+import timm
+import torch
+
+from core.backends import FusedNet, TorchBackend, create_backend, trace_frozen, quantize_int8, export_onnx
+from core.predictor import CFG, load_model, _load_tensor
+
+EXTS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def export(args):
+    # Plain nn.SiLU etc. instead of custom autograd ops, so every exporter can trace it
+    with timm.layers.set_layer_config(scriptable=True, exportable=True):
+        fused = FusedNet(load_model())
+
+    if args.torchscript:
+        path = CFG.get("torchscript_path", "disease_model/model.ts")
+        torch.jit.save(trace_frozen(fused), path)
+        print("Saved:", path)
+
+    if args.int8_linear:
+        path = CFG.get("int8_path", "disease_model/model.int8.ts")
+        with torch.no_grad():
+            scripted = torch.jit.freeze(torch.jit.trace(quantize_int8(fused), torch.randn(8, 3, 224, 224)))
+        torch.jit.save(scripted, path)
+        print("Saved:", path)
+
+    if args.onnx or args.onnx_int8:
+        path = CFG.get("onnx_path", "disease_model/model.onnx")
+        export_onnx(fused, path)
+        print("Saved:", path)
+
+        if args.onnx_int8:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            out = path[:-len(".onnx")] + ".int8.onnx"
+            quantize_dynamic(path, out, weight_type=QuantType.QInt8)
+            print("Saved:", out)
+
+
+# ============================================================
+# PARITY CHECK
+# ============================================================
+def load_images(folder: str) -> torch.Tensor:
+    files = sorted(
+        os.path.join(root, f)
+        for root, _, names in os.walk(folder)
+        for f in names if f.lower().endswith(EXTS)
+    )
+    tensors = []
+    for path in files:
+        with open(path, "rb") as f:
+            x = _load_tensor(f.read())
+        if x is not None:
+            tensors.append(x)
+    return torch.stack(tensors)
+
+
+def run(backend, x, batch_size: int):
+    outs, start = [], time.perf_counter()
+    for i in range(0, len(x), batch_size):
+        outs.append(backend(x[i:i + batch_size])[1])
+    return torch.cat(outs), len(x) / (time.perf_counter() - start)
+
+
+def check(folder: str, kinds: list, batch_size: int, threads: int) -> bool:
+    torch.set_num_threads(threads)
+    x = load_images(folder)
+    print(f"{len(x)} images from {folder}")
+
+    ref = TorchBackend("eager", FusedNet(load_model()))
+    ref_logits, ref_ips = run(ref, x, batch_size)
+    ref_top1 = ref_logits.argmax(dim=1)
+    print(f"eager        {ref_ips:7.1f} img/s")
+
+    ok = True
+    for kind in kinds:
+        logits, ips = run(create_backend(kind, load_model, CFG, threads), x, batch_size)
+        mismatched = (logits.argmax(dim=1) != ref_top1).sum().item()
+        diff = (logits - ref_logits).abs().max().item()
+        print(f"{kind:12} {ips:7.1f} img/s  x{ips / ref_ips:.2f}  "
+              f"top-1 mismatches: {mismatched}/{len(x)}  max |dlogit|: {diff:.4f}")
+        ok = ok and mismatched == 0
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--torchscript", action="store_true")
+    ap.add_argument("--int8-linear", "--int8", dest="int8_linear", action="store_true")
+    ap.add_argument("--onnx", action="store_true")
+    ap.add_argument("--onnx-int8", action="store_true")
+    ap.add_argument("--check", metavar="FOLDER", help="validation images (searched recursively)")
+    ap.add_argument("--no-export", action="store_true", help="only run --check on existing artifacts")
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--threads", type=int, default=CFG.get("inference_threads_per_worker", 2))
+    args = ap.parse_args()
+
+    if not (args.torchscript or args.int8_linear or args.onnx or args.onnx_int8):
+        args.torchscript = args.int8_linear = args.onnx = True
+
+    if not args.no_export:
+        export(args)
+
+    if args.check:
+        kinds = [k for k, on in (("torchscript", args.torchscript), ("int8_linear", args.int8_linear), ("onnx", args.onnx)) if on]
+        if not check(args.check, kinds, args.batch_size, args.threads):
+            print("Parity check FAILED")
+            sys.exit(1)
+        print("Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Report where process startup time goes.
+
+Runs `python -X importtime` on the bot module in a fresh interpreter and
+prints the slowest modules (cumulative and self time), the total, and
+whether any heavy ML/SDK package was imported at startup (it should not
+be: torch, timm, torchvision, PIL and openai load lazily).
+
+Usage:
+    python profile_startup.py [--module bot.telegram_bot] [--top 25]
+"""
+import argparse
+import re
+import subprocess
+import sys
+import time
+
+HEAVY = ("torch", "timm", "torchvision", "PIL", "openai", "onnxruntime", "numpy")
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile(module: str) -> tuple:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-2000:])
+        sys.exit(proc.returncode)
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = LINE.match(line)
+        if m:
+            self_us, cum_us, indent, name = m.groups()
+            rows.append({"module": name, "self_ms": int(self_us) / 1000,
+                         "cum_ms": int(cum_us) / 1000, "depth": (len(indent) - 1) // 2})
+    return rows, wall
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--module", default="bot.telegram_bot")
+    ap.add_argument("--top", type=int, default=25)
+    args = ap.parse_args()
+
+    rows, wall = profile(args.module)
+    top_level = [r for r in rows if r["depth"] == 0]
+    # Direct imports of the profiled module (what its own import lines cost)
+    direct = [r for r in rows if r["depth"] == 1]
+
+    print(f"Slowest imports made by {args.module} (cumulative ms):")
+    for r in sorted(direct, key=lambda r: r["cum_ms"], reverse=True)[:args.top]:
+        print(f"  {r['cum_ms']:9.1f}  {r['module']}")
+
+    print("\nSlowest modules by own time (ms):")
+    for r in sorted(rows, key=lambda r: r["self_ms"], reverse=True)[:args.top]:
+        print(f"  {r['self_ms']:9.1f}  {r['module']}")
+
+    total = sum(r["cum_ms"] for r in top_level)
+    print(f"\nImports: {total:.0f} ms   interpreter wall time: {wall * 1000:.0f} ms")
+
+    loaded = sorted({r["module"].split(".")[0] for r in rows} & set(HEAVY))
+    if loaded:
+        print("Heavy packages imported at startup:", ", ".join(loaded))
+    else:
+        print("No heavy packages imported at startup")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,5 @@
 import json
 import logging
-import base64
-from io import BytesIO
-from PIL import Image
 
 from telegram import Update
 from telegram.ext import (
@@ -15,6 +12,8 @@ from telegram.ext import (
 
 from openai import OpenAI
 
+from core.vision import prepare_image
+
 # Load config
 with open("config.json", "r") as f:
     config = json.load(f)
@@ -54,7 +53,8 @@ async def ask_model(model: str, desc: str, b64_image: str) -> str:
                     },
                     {
                         "type": "input_image",
-                        "image_url": f"data:image/jpeg;base64,{b64_image}"
+                        "image_url": f"data:image/jpeg;base64,{b64_image}",
+                        "detail": "high"
                     }
                 ]
             }]
@@ -81,11 +81,13 @@ async def handle_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
         file = await photo.get_file()
         img_bytes = await file.download_as_bytearray()
 
-        # Convert image to Base64
-        img = Image.open(BytesIO(img_bytes))
-        buf = BytesIO()
-        img.save(buf, format="JPEG")
-        b64_img = base64.b64encode(buf.getvalue()).decode("utf-8")
+        # Resize/compress once to the vision token budget; every model gets the same payload
+        image = prepare_image(img_bytes, "high")
+        b64_img = image["b64"]
+        logger.info(
+            "Image %dx%d q%d: %d bytes, ~%d tokens per model",
+            *image["size"], image["quality"], image["bytes"], image["tokens"]
+        )
 
         await update.message.reply_text("🧪 Analyzing leaf with multiple AI models…")
 
@@ -0,0 +1,102 @@
+"""
+Train the local leaf/plant presence head.
+
+Folder layout:
+    DATA/leaf/   photos that contain a leaf, plant, crop or tree
+    DATA/other/  everything else (people, documents, screenshots, ...)
+
+The EfficientNet-B3 backbone stays frozen; only a single linear layer
+on its pooled features is trained. The features come from the configured
+inference_backend, the same one the bot runs, so the head is fitted to
+the embeddings it will see (int8_linear and ONNX INT8 shift them a
+little). Retrain after switching backends. The result is saved to
+config["leaf_head_path"] and picked up by core/predictor.py.
+
+Usage:
+    python train_leaf_head.py DATA [--epochs 30]
+"""
+import argparse
+import os
+import random
+import sys
+
+import torch
+
+from core.predictor import BACKEND, LEAF_HEAD_PATH, load_backend, _load_tensor
+
+EXTS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def embed_folder(folder: str, batch_size: int = 32) -> torch.Tensor:
+    files = sorted(f for f in os.listdir(folder) if f.lower().endswith(EXTS))
+    backend = load_backend(torch.get_num_threads())
+    out = []
+
+    for i in range(0, len(files), batch_size):
+        tensors = []
+        for name in files[i:i + batch_size]:
+            with open(os.path.join(folder, name), "rb") as f:
+                x = _load_tensor(f.read())
+            if x is not None:
+                tensors.append(x)
+        if not tensors:
+            continue
+
+        emb, _ = backend(torch.stack(tensors))
+        # clone(): inference-mode tensors cannot be used for training
+        out.append(emb.clone())
+
+        print(f"{folder}: {min(i + batch_size, len(files))}/{len(files)}")
+
+    return torch.cat(out) if out else torch.empty(0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("data")
+    ap.add_argument("--epochs", type=int, default=30)
+    ap.add_argument("--lr", type=float, default=1e-3)
+    ap.add_argument("--out", default=LEAF_HEAD_PATH)
+    args = ap.parse_args()
+
+    pos = embed_folder(os.path.join(args.data, "leaf"))
+    neg = embed_folder(os.path.join(args.data, "other"))
+    if not len(pos) or not len(neg):
+        sys.exit("Need photos in both leaf/ and other/")
+    print(f"Embeddings from the '{BACKEND}' backend")
+
+    x = torch.cat([pos, neg])
+    y = torch.cat([torch.ones(len(pos)), torch.zeros(len(neg))])
+
+    # 90/10 train/validation split
+    idx = list(range(len(x)))
+    random.Random(0).shuffle(idx)
+    cut = int(len(idx) * 0.9)
+    tr_idx, va_idx = idx[:cut], idx[cut:]
+
+    head = torch.nn.Linear(x.shape[1], 1)
+    opt = torch.optim.Adam(head.parameters(), lr=args.lr, weight_decay=1e-4)
+    loss_fn = torch.nn.BCEWithLogitsLoss()
+
+    for epoch in range(args.epochs):
+        random.shuffle(tr_idx)
+        for i in range(0, len(tr_idx), 64):
+            b = tr_idx[i:i + 64]
+            opt.zero_grad()
+            loss = loss_fn(head(x[b]).squeeze(1), y[b])
+            loss.backward()
+            opt.step()
+
+        if va_idx:
+            with torch.no_grad():
+                pred = torch.sigmoid(head(x[va_idx]).squeeze(1)) > 0.5
+                acc = (pred == y[va_idx].bool()).float().mean().item()
+            print(f"epoch {epoch + 1}: loss={loss.item():.4f} val_acc={acc:.3f}")
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    torch.save(head.state_dict(), args.out)
+    print("Saved:", args.out)
+
+
+if __name__ == "__main__":
+    main()